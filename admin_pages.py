@@ -0,0 +1,134 @@
+"""
+Paginated admin listings.
+
+The admin dashboard and its JSON endpoints read students, elections and
+results one page at a time. Pages are keyset-paginated on the primary key
+(`after` is the last id of the previous page), so every page costs the same
+however far into the roster it is, and only one page is held in memory.
+
+Searches (`q`) are case-insensitive substring or prefix matches, with `%`
+and `_` in the search text taken literally. They are not served from an
+index: the id-ordered scan stops once a page is full, so a common term is
+cheap and a rare one reads most of the table.
+"""
+
+from sqlalchemy import func, or_
+from models import db, Student, Election, Candidate
+from results_cache import results_cache, make_etag
+
+
+def page_args(args, default_limit: int = 50, max_limit: int = 500) -> tuple:
+    """
+    Read `after`, `limit` and `q` from request args.
+
+    Returns:
+        tuple: (after: int, limit: int, q: str or None)
+    """
+    after = args.get('after', type=int) or 0
+    limit = args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    q = (args.get('q') or '').strip() or None
+    return after, limit, q
+
+
+def _like(q: str, prefix: bool = False) -> str:
+    """LIKE pattern matching `q` literally, anywhere (or only at the start)."""
+    q = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{q}%' if prefix else f'%{q}%'
+
+
+def _page(rows: list, limit: int, key) -> dict:
+    """Trim the one-past-the-end row fetched to tell whether there is a next page."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': rows,
+        'next_after': key(rows[-1]) if has_more else None
+    }
+
+
+def student_page(after: int = 0, limit: int = 50, q: str = None) -> dict:
+    """
+    One page of students, ordered by id.
+
+    `q` matches the start of the student ID or email, or any part of the
+    name, ignoring case. Unindexed (see the module docstring).
+    """
+    query = db.session.query(
+        Student.id, Student.student_id, Student.email, Student.name, Student.is_admin
+    ).filter(Student.id > after)
+    if q:
+        query = query.filter(or_(
+            Student.student_id.ilike(_like(q, prefix=True), escape='\\'),
+            Student.email.ilike(_like(q, prefix=True), escape='\\'),
+            Student.name.ilike(_like(q), escape='\\')
+        ))
+
+    rows = query.order_by(Student.id).limit(limit + 1).all()
+    return _page([
+        {
+            'id': r.id,
+            'student_id': r.student_id,
+            'email': r.email,
+            'name': r.name,
+            'is_admin': bool(r.is_admin)
+        }
+        for r in rows
+    ], limit, key=lambda item: item['id'])
+
+
+def _election_ids(after: int, limit: int, q: str) -> list:
+    query = db.session.query(Election.id).filter(Election.id > after)
+    if q:
+        query = query.filter(Election.title.ilike(_like(q), escape='\\'))
+    return [r.id for r in query.order_by(Election.id).limit(limit + 1)]
+
+
+def election_choices() -> list:
+    """Every election as {'id', 'title'}, for dropdowns (e.g. adding a candidate)."""
+    return [
+        {'id': r.id, 'title': r.title}
+        for r in db.session.query(Election.id, Election.title).order_by(Election.id)
+    ]
+
+
+def election_page(after: int = 0, limit: int = 50, q: str = None) -> dict:
+    """One page of elections with their candidate counts. `q` matches part of the title, ignoring case."""
+    ids = _election_ids(after, limit, q)
+    if not ids:
+        return {'items': [], 'next_after': None}
+
+    candidate_counts = dict(db.session.query(
+        Candidate.election_id, func.count(Candidate.id)
+    ).filter(Candidate.election_id.in_(ids)).group_by(Candidate.election_id).all())
+
+    rows = db.session.query(
+        Election.id, Election.title, Election.description, Election.is_active, Election.created_at
+    ).filter(Election.id.in_(ids)).order_by(Election.id).all()
+    return _page([
+        {
+            'id': r.id,
+            'title': r.title,
+            'description': r.description,
+            'is_active': bool(r.is_active),
+            'created_at': r.created_at.isoformat() if r.created_at else None,
+            'candidate_count': candidate_counts.get(r.id, 0)
+        }
+        for r in rows
+    ], limit, key=lambda item: item['id'])
+
+
+def results_page(after: int = 0, limit: int = 20, q: str = None) -> dict:
+    """
+    One page of election results, in the get_all_election_results() shape.
+
+    Results come from results_cache; `etag` identifies the page's content.
+    """
+    ids = _election_ids(after, limit, q)
+    entries = results_cache.get_many(ids[:limit])
+    next_after = ids[limit - 1] if len(ids) > limit else None
+    return {
+        'items': [entry.result for entry in entries],
+        'next_after': next_after,
+        'etag': make_etag([entry.etag for entry in entries], next_after)
+    }
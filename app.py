@@ -1,10 +1,34 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from config import Config
-from models import db, Student, Election, Candidate, VoteToken, Vote, OTPCode
+from models import db, Student, Election, Candidate, CandidateTally, VoteToken, Vote, OTPCode
 from auth import admin_required
-from voting import cast_vote, has_voted, get_election_results, get_all_election_results
-from email_service import send_otp_email
+from voting import (
+    cast_vote, cast_ballot, get_voted_election_ids, reconcile_tallies,
+    create_candidate, remove_candidate, remove_vote_tokens
+)
+from email_queue import email_queue, enqueue_otp_email
+import click
+from datetime import datetime, timezone
+from werkzeug.http import http_date
+import csv
+import io
+import migrations
+import prewarm
+from roster_import import import_roster
+from pool_metrics import pool_status
+from profiling import sql_profiler
+import sqlite_profile
+from sqlite_profile import serial_writer
+from user_cache import user_cache, UserSnapshot
+from catalog import election_catalog
+from results_feed import results_feed
+from results_cache import results_cache
+from public_results import FORMATS, encoded_results, closed_elections_page
+import otp_store
+from otp_sweeper import otp_sweeper
+from vote_shards import vote_shards
+from admin_pages import page_args, student_page, election_page, election_choices, results_page
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -12,6 +36,16 @@ app.config.from_object(Config)
 
 # Initialize extensions
 db.init_app(app)
+sqlite_profile.init_app(app)
+sql_profiler.init_app(app)
+email_queue.init_app(app)
+user_cache.init_app(app)
+election_catalog.init_app(app)
+results_feed.init_app(app)
+results_cache.init_app(app)
+otp_store.init_app(app)
+otp_sweeper.init_app(app)
+vote_shards.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -19,10 +53,17 @@ login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'error'
 
 
+def _load_user_snapshot(user_id):
+    student = db.session.query(
+        Student.id, Student.student_id, Student.email, Student.name, Student.is_admin
+    ).filter(Student.id == user_id).first()
+    return UserSnapshot.from_student(student) if student else None
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user for Flask-Login."""
-    return Student.query.get(int(user_id))
+    """Load user for Flask-Login (cached read-only snapshot)."""
+    return user_cache.get(int(user_id), _load_user_snapshot)
 
 
 # ==================== AUTHENTICATION ROUTES ====================
@@ -90,13 +131,32 @@ def login():
         if email == 'shaikmaaz77zz@gmail.com' and not student.is_admin:
             student.is_admin = True
             db.session.commit()
+            user_cache.invalidate(student.id)
 
+        # A code already in the student's inbox (e.g. from a pre-warm run)
+        # can be entered together with the email
+        if request.form.get('otp', '').strip():
+            session['pending_student_id'] = student.id
+            session['pending_email'] = email
+            return verify_otp()
+        
+        # Keep a code that is still valid (e.g. mailed by a pre-warm run)
+        # instead of replacing it and mailing another one. A student who
+        # lost the email asks for a new code on the next page (/resend-otp).
+        if OTPCode.has_pending_otp(student.id):
+            session['pending_student_id'] = student.id
+            session['pending_email'] = email
+            flash(f'Enter the OTP already sent to {email}, or request a new one.', 'success')
+            return redirect(url_for('verify_otp'))
+        
         # Generate and send OTP
-        otp_code = OTPCode.generate_otp(student.id)
+        otp_code = serial_writer.run(OTPCode.generate_otp, student.id)
+        otp_sweeper.start()
         
         # DEBUG: Print OTP to console for testing without email access
         print(f"\n{'='*30}\n🔐 DEBUG OTP for {email}: {otp_code}\n{'='*30}\n")
-        success, message = send_otp_email(student.email, otp_code, student.name)
+        # Delivery happens in the background - this only writes to the outbox
+        success, message = enqueue_otp_email(student.email, otp_code, student.name)
         
         if success:
             # Store student ID in session for OTP verification
@@ -138,7 +198,7 @@ def verify_otp():
             return render_template('verify_otp.html', email=email)
         
         # Verify OTP
-        success, message = OTPCode.verify_otp(student_id, otp_code)
+        success, message = serial_writer.run(OTPCode.verify_otp, student_id, otp_code)
         
         if success:
             # Clear session data
@@ -160,7 +220,7 @@ def verify_otp():
 
 @app.route('/resend-otp', methods=['POST'])
 def resend_otp():
-    """Resend OTP code."""
+    """Replace the pending OTP with a new one and mail it (for lost emails)."""
     student_id = session.get('pending_student_id')
     
     if not student_id:
@@ -171,8 +231,9 @@ def resend_otp():
         return redirect(url_for('login'))
     
     # Generate and send new OTP
-    otp_code = OTPCode.generate_otp(student.id)
-    success, message = send_otp_email(student.email, otp_code, student.name)
+    otp_code = serial_writer.run(OTPCode.generate_otp, student.id)
+    otp_sweeper.start()
+    success, message = enqueue_otp_email(student.email, otp_code, student.name)
     
     if success:
         flash('New OTP sent! Check your inbox.', 'success')
@@ -197,15 +258,6 @@ def logout():
 @login_required
 def vote():
     """Voting page for students."""
-    # Get active elections
-    elections = Election.query.filter_by(is_active=True).all()
-    
-    # Check which elections the user has already voted in
-    voted_elections = set()
-    for election in elections:
-        if has_voted(current_user.id, election.id):
-            voted_elections.add(election.id)
-    
     if request.method == 'POST':
         election_id = request.form.get('election_id', type=int)
         candidate_id = request.form.get('candidate_id', type=int)
@@ -215,21 +267,66 @@ def vote():
             return redirect(url_for('vote'))
         
         # Cast vote
-        success, message = cast_vote(current_user.id, election_id, candidate_id)
+        success, message = serial_writer.run_in_lane(
+            vote_shards.lane(election_id), cast_vote, current_user.id, election_id, candidate_id
+        )
         
         if success:
+            results_feed.notify()
             flash(message, 'success')
         else:
             flash(message, 'error')
         
         return redirect(url_for('vote'))
     
+    # Active elections and their candidates come from the in-memory catalog
+    elections = election_catalog.get().elections
+    
+    # Check which elections the user has already voted in
+    voted_elections = get_voted_election_ids(current_user.id, [e.id for e in elections])
+    
     return render_template('vote.html', 
                          elections=elections, 
                          voted_elections=voted_elections,
                          user=current_user)
 
 
+@app.route('/vote/ballot', methods=['POST'])
+@login_required
+def vote_ballot():
+    """Submit votes for several elections at once (all or nothing)."""
+    # One field per election: candidate_<election_id>=<candidate_id>
+    selections = {}
+    for field, value in request.form.items():
+        if field.startswith('candidate_') and value:
+            try:
+                selections[int(field[len('candidate_'):])] = int(value)
+            except ValueError:
+                continue
+    
+    if not selections:
+        flash('Please select at least one candidate.', 'error')
+        return redirect(url_for('vote'))
+    
+    # The ballot writes every election's shard, so it holds all of their lanes
+    success, reasons = serial_writer.run_in_lanes(
+        [vote_shards.lane(election_id) for election_id in selections], cast_ballot, current_user.id, selections
+    )
+    
+    if success:
+        results_feed.notify()
+        flash(f'Your votes in {len(selections)} elections have been cast successfully!', 'success')
+    elif not reasons:
+        flash('Please select at least one candidate.', 'error')
+    else:
+        titles = dict(db.session.query(Election.id, Election.title).filter(Election.id.in_(list(reasons))))
+        flash('No votes were cast. Please fix the following and submit again.', 'error')
+        for election_id, reason in reasons.items():
+            flash(f'{titles.get(election_id, "Election")}: {reason}', 'error')
+    
+    return redirect(url_for('vote'))
+
+
 # ==================== ADMIN ROUTES ====================
 
 @app.route('/admin')
@@ -237,11 +334,69 @@ def vote():
 @admin_required
 def admin():
     """Admin dashboard - view election results."""
-    results = get_all_election_results()
-    students = Student.query.all()
-    elections = Election.query.all()
-    return render_template('admin.html', results=results, students=students, 
-                          elections=elections, user=current_user)
+    # Only the first page of each section; the rest is loaded from /admin/api/*.
+    # Dropdowns get every election (id and title only)
+    page_size = app.config['ADMIN_PAGE_SIZE']
+    results = results_page(limit=page_size)
+    students = student_page(limit=page_size)
+    elections = election_page(limit=page_size)
+    return render_template('admin.html', results=results['items'], students=students['items'], 
+                          elections=elections['items'], election_choices=election_choices(),
+                          user=current_user,
+                          next_after={
+                              'results': results['next_after'],
+                              'students': students['next_after'],
+                              'elections': elections['next_after']
+                          })
+
+
+@app.route('/admin/api/students')
+@login_required
+@admin_required
+def api_students():
+    """Students page as JSON: ?after=<last id>&limit=&q=<search>."""
+    return jsonify(student_page(*page_args(request.args, app.config['ADMIN_PAGE_SIZE'], app.config['ADMIN_PAGE_MAX'])))
+
+
+@app.route('/admin/api/elections')
+@login_required
+@admin_required
+def api_elections():
+    """Elections page as JSON: ?after=<last id>&limit=&q=<search>."""
+    return jsonify(election_page(*page_args(request.args, app.config['ADMIN_PAGE_SIZE'], app.config['ADMIN_PAGE_MAX'])))
+
+
+@app.route('/admin/api/results')
+@login_required
+@admin_required
+def api_results():
+    """Results page as JSON: ?after=<last election id>&limit=&q=<search>. Supports If-None-Match."""
+    page = results_page(*page_args(request.args, app.config['ADMIN_PAGE_SIZE'], app.config['ADMIN_PAGE_MAX']))
+    if page['etag'] in request.if_none_match:
+        return '', 304, {'ETag': f'"{page["etag"]}"'}
+    response = jsonify(page)
+    response.set_etag(page['etag'])
+    return response
+
+
+@app.route('/admin/results/stream')
+@login_required
+@admin_required
+def results_stream():
+    """Live results as Server-Sent Events: a snapshot, then tally deltas as votes come in."""
+    subscription = results_feed.subscribe()
+    
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            yield from subscription.stream(app.config['RESULTS_STREAM_HEARTBEAT_SECONDS'])
+        finally:
+            results_feed.unsubscribe(subscription)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let a proxy buffer the stream
+    })
 
 
 @app.route('/admin/students/add', methods=['POST'])
@@ -284,6 +439,31 @@ def add_student():
     return redirect(url_for('admin'))
 
 
+@app.route('/admin/students/import', methods=['POST'])
+@login_required
+@admin_required
+def import_students():
+    """Bulk-import students from an uploaded CSV roster (student_id, email, name)."""
+    upload = request.files.get('roster')
+    if not upload or not upload.filename:
+        flash('Please choose a CSV file to import.', 'error')
+        return redirect(url_for('admin'))
+    
+    # Read the upload as a stream - large files are spooled to disk by Werkzeug
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    report = import_roster(stream)
+    
+    if request.args.get('format') == 'json':
+        return jsonify(report.to_dict())
+    
+    flash(f'Imported {report.imported} of {report.rows_read} students.', 'success')
+    for line, student_id, reason in report.errors[:5]:
+        flash(f'Line {line}: {reason}', 'error')
+    if len(report.errors) > 5:
+        flash(f'...and {len(report.errors) - 5} more rows skipped. Use ?format=json for the full report.', 'error')
+    return redirect(url_for('admin'))
+
+
 @app.route('/admin/students/<int:id>/delete', methods=['POST'])
 @login_required
 @admin_required
@@ -297,11 +477,14 @@ def delete_student(id):
         return redirect(url_for('admin'))
     
     try:
-        # Delete related data
-        OTPCode.query.filter_by(student_id=id).delete()
-        VoteToken.query.filter_by(student_id=id).delete()
+        # Delete related data. Vote tokens are deleted on each shard's writer
+        # lane, like ballots are written, before the student row goes
+        for lane, election_ids in vote_shards.lanes().items():
+            serial_writer.run_in_lane(lane, remove_vote_tokens, id, election_ids)
+        OTPCode.discard_otps(id)
         db.session.delete(student)
         db.session.commit()
+        user_cache.invalidate(id)
         flash(f'Student {student.name} deleted.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -326,6 +509,8 @@ def add_election():
         election = Election(title=title, description=description, is_active=True)
         db.session.add(election)
         db.session.commit()
+        vote_shards.create(election)
+        election_catalog.invalidate()
         flash(f'Election "{title}" created!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -343,7 +528,9 @@ def toggle_election(id):
     
     try:
         election.is_active = not election.is_active
+        election.closed_at = None if election.is_active else datetime.utcnow()
         db.session.commit()
+        election_catalog.invalidate()
         status = 'activated' if election.is_active else 'deactivated'
         flash(f'Election "{election.title}" {status}.', 'success')
     except Exception as e:
@@ -361,11 +548,16 @@ def delete_election(id):
     election = Election.query.get_or_404(id)
     
     try:
-        Vote.query.filter_by(election_id=id).delete()
-        VoteToken.query.filter_by(election_id=id).delete()
+        if not vote_shards.enabled:
+            Vote.query.filter_by(election_id=id).delete()
+            CandidateTally.query.filter_by(election_id=id).delete()
+            VoteToken.query.filter_by(election_id=id).delete()
         Candidate.query.filter_by(election_id=id).delete()
         db.session.delete(election)
         db.session.commit()
+        # With VOTE_SHARDING the ballots go with their shard in one drop
+        vote_shards.drop(id)
+        election_catalog.invalidate()
         flash(f'Election "{election.title}" deleted.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -390,9 +582,9 @@ def add_candidate():
     election = Election.query.get_or_404(election_id)
     
     try:
-        candidate = Candidate(election_id=election_id, name=name, description=description)
-        db.session.add(candidate)
-        db.session.commit()
+        # Writes the election's shard, so it runs on the shard's writer lane
+        serial_writer.run_in_lane(vote_shards.lane(election_id), create_candidate, election_id, name, description)
+        election_catalog.invalidate()
         flash(f'Candidate "{name}" added to {election.title}!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -409,9 +601,8 @@ def delete_candidate(id):
     candidate = Candidate.query.get_or_404(id)
     
     try:
-        Vote.query.filter_by(candidate_id=id).delete()
-        db.session.delete(candidate)
-        db.session.commit()
+        serial_writer.run_in_lane(vote_shards.lane(candidate.election_id), remove_candidate, id)
+        election_catalog.invalidate()
         flash(f'Candidate "{candidate.name}" deleted.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -420,6 +611,204 @@ def delete_candidate(id):
     return redirect(url_for('admin'))
 
 
+@app.route('/admin/otps/prewarm', methods=['POST'])
+@login_required
+@admin_required
+def prewarm_otps():
+    """Pre-generate and mail OTPs for a cohort before an election opens."""
+    cohort = request.form.get('cohort', '').strip() or None
+    job, message = prewarm.start_prewarm(app, cohort)
+    flash(message, 'success' if job else 'error')
+    return redirect(url_for('admin'))
+
+
+@app.route('/admin/otps/prewarm/status')
+@login_required
+@admin_required
+def prewarm_status():
+    """Progress and throughput of the current pre-warm run."""
+    job = prewarm.current_job()
+    if not job:
+        return jsonify({'status': 'idle'})
+    return jsonify(job.to_dict())
+
+
+@app.route('/admin/stats/pool')
+@login_required
+@admin_required
+def pool_stats():
+    """Database connection pool usage and checkout wait times."""
+    return jsonify(pool_status(db.engine))
+
+
+@app.route('/admin/stats/sql', methods=['GET', 'DELETE'])
+@login_required
+@admin_required
+def sql_stats():
+    """Per-endpoint query counts, DB time and slowest statements (SQL_PROFILING=1). DELETE resets them."""
+    if request.method == 'DELETE':
+        sql_profiler.reset()
+    return jsonify(sql_profiler.to_dict())
+
+
+# ==================== PUBLIC API ====================
+
+@app.route('/api/results')
+def public_results_index():
+    """Closed elections whose results are public: ?after=<last id>&limit=."""
+    after, limit, _ = page_args(request.args, app.config['ADMIN_PAGE_SIZE'], app.config['ADMIN_PAGE_MAX'])
+    page = closed_elections_page(after, limit)
+    if page['etag'] in request.if_none_match:
+        return '', 304, {'ETag': f'"{page["etag"]}"'}
+    response = jsonify(page)
+    response.set_etag(page['etag'])
+    response.headers['Cache-Control'] = f"public, max-age={app.config['PUBLIC_RESULTS_MAX_AGE']}"
+    return response
+
+
+@app.route('/api/results/<int:election_id>')
+def public_results(election_id):
+    """Results of a closed election (?format=full|columnar), with conditional GET and gzip."""
+    fmt = request.args.get('format', 'full')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    
+    encoded = encoded_results.get(election_id, fmt)
+    if encoded is None:
+        # Open elections are indistinguishable from missing ones
+        return jsonify({'error': 'No published results for this election.'}), 404
+    
+    # Each encoding is its own representation, so gzip gets its own strong ETag
+    gzipped = 'gzip' in request.accept_encodings
+    etag = f'{encoded.etag}-gzip' if gzipped else encoded.etag
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f"public, max-age={app.config['PUBLIC_RESULTS_MAX_AGE']}",
+        'Vary': 'Accept-Encoding'
+    }
+    if encoded.last_modified:
+        headers['Last-Modified'] = http_date(encoded.last_modified)
+    
+    if request.if_none_match:
+        not_modified = etag in request.if_none_match
+    else:
+        not_modified = bool(
+            encoded.last_modified and request.if_modified_since
+            and encoded.last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+        )
+    if not_modified:
+        return '', 304, headers
+    
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(encoded.gzipped, mimetype='application/json', headers=headers)
+    return Response(encoded.body, mimetype='application/json', headers=headers)
+
+
+# ==================== CLI COMMANDS ====================
+
+@app.cli.command('prewarm-otps')
+@click.option('--cohort', default=None, help='Only students whose ID starts with this prefix.')
+@click.option('--sessions', default=Config.OTP_PREWARM_SESSIONS, help='Parallel SMTP sessions.')
+@click.option('--batch-size', default=Config.OTP_PREWARM_BATCH_SIZE, help='Students per batch.')
+def prewarm_otps_command(cohort, sessions, batch_size):
+    """Generate and mail OTPs for a whole cohort."""
+    if app.config['OTP_STORE'] == 'memory':
+        # Codes would only exist in this short-lived CLI process
+        raise click.ClickException('OTP_STORE=memory: pre-warm from the admin dashboard instead.')
+    
+    def report(progress):
+        click.echo(
+            f"{progress['sent'] + progress['failed']}/{progress['total']} processed "
+            f"({progress['sent']} sent, {progress['failed']} failed) - "
+            f"{progress['messages_per_second']} msg/s"
+        )
+    
+    job = prewarm.prewarm_otps(
+        prewarm.PrewarmJob(cohort),
+        sessions=sessions,
+        batch_size=batch_size,
+        expiry_minutes=app.config['OTP_PREWARM_EXPIRY_MINUTES'],
+        progress=report
+    )
+    click.echo(f"Pre-warm {job.status} in {job.elapsed:.1f}s")
+
+
+@app.cli.command('import-roster')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, help='Rows validated and inserted per batch.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), default=None,
+              help='Write the per-row error report to this CSV file.')
+def import_roster_command(path, chunk_size, errors_path):
+    """Bulk-import students from a CSV roster (student_id, email, name)."""
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_roster(stream, chunk_size=chunk_size)
+    
+    click.echo(f"✓ Imported {report.imported} of {report.rows_read} students ({len(report.errors)} skipped).")
+    if errors_path:
+        with open(errors_path, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['line', 'student_id', 'reason'])
+            writer.writerows(report.errors)
+        click.echo(f"Error report written to {errors_path}")
+    else:
+        for line, student_id, reason in report.errors:
+            click.echo(f"  line {line}: {reason}")
+
+
+@app.cli.command('reconcile-tallies')
+@click.option('--fix', is_flag=True, help='Overwrite drifted tallies with the recomputed counts.')
+def reconcile_tallies_command(fix):
+    """Recompute vote tallies from the votes table and report drift."""
+    drift = reconcile_tallies(fix=fix)
+    if not drift:
+        click.echo("✓ All tallies match the votes table.")
+        return
+    
+    for d in drift:
+        click.echo(
+            f"Candidate {d['candidate_id']} (election {d['election_id']}): "
+            f"tally {d['tally']}, actual {d['actual']}"
+        )
+    click.echo(f"{len(drift)} tallies {'fixed' if fix else 'drifted'}.")
+
+
+@app.cli.command('sweep-otps')
+@click.option('--batch-size', default=Config.OTP_SWEEP_BATCH_SIZE, help='Rows deleted per transaction.')
+def sweep_otps_command(batch_size):
+    """Delete expired and used OTP codes, and finished outbox emails past retention."""
+    deleted = OTPCode.sweep_expired(batch_size)
+    click.echo(f"✓ Deleted {deleted} expired or used OTP codes.")
+    purged = email_queue.purge_finished(batch_size)
+    click.echo(f"✓ Deleted {purged} finished outbox emails older than {app.config['EMAIL_RETENTION_DAYS']:g} days.")
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Add missing tables and indexes to an existing database."""
+    created = migrations.upgrade_database()
+    if created:
+        for name in created:
+            click.echo(f"✓ Created {name}")
+    else:
+        click.echo("✓ Database schema is up to date.")
+    if vote_shards.enabled:
+        click.echo(f"✓ Vote shards ({vote_shards.mode}) ready for {vote_shards.create_all()} elections")
+
+
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    """EXPLAIN the hot queries and report any table scans."""
+    report = migrations.check_query_plans()
+    for entry in report:
+        mark = '✓' if entry['uses_index'] else '✗'
+        click.echo(f"{mark} {entry['name']}: {'; '.join(entry['plan'])}")
+    
+    scans = [entry['name'] for entry in report if not entry['uses_index']]
+    if scans:
+        raise click.ClickException(f"{len(scans)} hot queries use a table scan.")
+
+
 # ==================== ERROR HANDLERS ====================
 
 @app.errorhandler(404)
@@ -0,0 +1,157 @@
+"""
+ASGI serving mode.
+
+Serves the Flask app from an asyncio event loop (uvicorn). Connections and
+request bodies are handled on the loop, so a slow or idle client costs a
+coroutine rather than a server thread, and one process can hold thousands
+of logins in flight. This is not an async rewrite: Flask views, database
+access and SMTP stay synchronous, and each view runs on a thread through
+a2wsgi's WSGI-to-ASGI adapter. This module only decides which pool a
+request gets:
+
+- /login, /verify-otp and /resend-otp run on their own thread pool
+  (ASGI_AUTH_THREADS, sized to the database pool), so a login surge cannot
+  starve voting and admin requests, which use a second pool (ASGI_THREADS).
+  At most ASGI_MAX_PENDING_LOGINS auth requests wait for a thread; beyond
+  that they get a 503 with Retry-After straight from the loop.
+- OTP emails already leave the request through the outbox (email_queue.py),
+  so no SMTP traffic happens on either pool.
+
+Usage:
+    pip install -r requirements-asgi.txt
+    python asgi.py                       # or: uvicorn asgi:application
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from a2wsgi import WSGIMiddleware
+from app import app
+from email_queue import email_queue
+
+
+AUTH_PATHS = frozenset(('/login', '/verify-otp', '/resend-otp'))
+
+# Set once the client of the current request has disconnected. a2wsgi runs
+# the view in a copy of the request's context, so the pool thread sees it.
+_client_gone = contextvars.ContextVar('client_gone')
+
+
+def stop_on_disconnect(wsgi_app):
+    """
+    Wrap a WSGI app so streamed responses (e.g. the results stream) stop
+    once their client is gone; uvicorn silently drops what is sent after a
+    disconnect, so they would otherwise hold a pool thread forever.
+    """
+    def application(environ, start_response):
+        iterable = wsgi_app(environ, start_response)
+        client_gone = _client_gone.get(None)
+        return iterable if client_gone is None else _until(iterable, client_gone)
+    return application
+
+
+def _until(iterable, event: threading.Event):
+    try:
+        for chunk in iterable:
+            if event.is_set():
+                return
+            yield chunk
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+class FlaskASGI:
+    """ASGI application running a WSGI app's requests on two bounded thread pools."""
+
+    def __init__(self, wsgi_app, threads: int, auth_threads: int, max_pending_logins: int):
+        wsgi_app = stop_on_disconnect(wsgi_app)
+        self.max_pending_logins = max_pending_logins
+        self.pending_logins = 0
+        self._default = WSGIMiddleware(wsgi_app, workers=threads)
+        self._auth = WSGIMiddleware(wsgi_app, workers=auth_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, email_queue.stop)
+                self._default.executor.shutdown(wait=False)
+                self._auth.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        is_auth = scope['path'] in AUTH_PATHS
+        if is_auth and self.pending_logins >= self.max_pending_logins:
+            await send({
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [(b'content-type', b'text/plain'), (b'retry-after', b'2')]
+            })
+            await send({'type': 'http.response.body', 'body': b'Too many logins in progress, please retry.'})
+            return
+
+        # Read the whole body on the loop; a slow upload never holds a thread
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.extend(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        async def replay_body():
+            return {'type': 'http.request', 'body': bytes(body), 'more_body': False}
+
+        # With the body consumed, the only message left is the disconnect
+        client_gone = threading.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            client_gone.set()
+
+        _client_gone.set(client_gone)
+        watcher = asyncio.get_running_loop().create_task(watch_disconnect())
+        if is_auth:
+            self.pending_logins += 1
+        try:
+            await (self._auth if is_auth else self._default)(scope, replay_body, send)
+        finally:
+            watcher.cancel()
+            if is_auth:
+                self.pending_logins -= 1
+
+
+application = FlaskASGI(
+    app.wsgi_app,
+    threads=app.config['ASGI_THREADS'],
+    auth_threads=app.config['ASGI_AUTH_THREADS'],
+    max_pending_logins=app.config['ASGI_MAX_PENDING_LOGINS']
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(
+        'asgi:application',
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 8000)),
+        # A single process holds all logins in flight (and is required by
+        # OTP_STORE=memory); run more instances behind a proxy to scale out
+        workers=1,
+        log_level=os.environ.get('LOG_LEVEL', 'info'),
+        backlog=4096
+    )
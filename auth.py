@@ -1,6 +1,8 @@
 from functools import wraps
 from flask import redirect, url_for, flash
 from flask_login import current_user
+from models import db, Student
+from user_cache import user_cache
 
 
 def admin_required(f):
@@ -10,7 +12,11 @@ def admin_required(f):
         if not current_user.is_authenticated:
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('login'))
-        if not current_user.is_admin:
+        # The cached user may be up to USER_CACHE_TTL_SECONDS old in this
+        # process (e.g. demoted or deleted from another worker)
+        is_admin = db.session.query(Student.is_admin).filter(Student.id == current_user.id).scalar()
+        if not is_admin:
+            user_cache.invalidate(current_user.id)
             flash('Admin access required.', 'error')
             return redirect(url_for('vote'))
         return f(*args, **kwargs)
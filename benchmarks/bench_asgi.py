@@ -0,0 +1,225 @@
+"""
+ASGI vs threaded WSGI login benchmark.
+
+Runs the app in-process under the threaded Werkzeug server (the sync path
+used by app.py) and under uvicorn with asgi.py, and drives the two-step
+login (POST /login, then POST /verify-otp with the emailed code) for many
+simulated students from an asyncio HTTP client holding up to --concurrency
+connections open at once. Each mode logs in its own set of students.
+
+--slow-client makes every client pause between sending the request headers
+and the form body, like a student on a poor mobile connection: the
+threaded server holds a thread per waiting request, the ASGI server only a
+coroutine.
+
+OTP emails go through the outbox as usual and are captured by
+CapturingSMTP. Reports logins/s, p50/p95/p99 latency per endpoint, errors
+(including 503s from ASGI_MAX_PENDING_LOGINS) and the peak thread count of
+the process.
+
+Usage:
+    pip install -r requirements-asgi.txt
+    python benchmarks/bench_asgi.py [--students 1000] [--concurrency 500] [--slow-client 0.5] [--mode both]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import socket
+import threading
+import time
+import urllib.parse
+
+from common import CapturingSMTP, percentile, use_temp_database
+
+use_temp_database('voting-asgi-')
+
+import uvicorn  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+from app import app  # noqa: E402
+from asgi import application  # noqa: E402
+from email_queue import email_queue  # noqa: E402
+from email_service import SMTPConnectionPool  # noqa: E402
+import init_db  # noqa: E402
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+@contextlib.contextmanager
+def wsgi_server():
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.port
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+@contextlib.contextmanager
+def asgi_server():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(
+        application, lifespan='off', log_level='warning', access_log=False, backlog=4096
+    ))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+class PeakThreads:
+    """Samples the process thread count in the background."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+
+async def post(port: int, path: str, form: dict, cookie: str = None, slow: float = 0):
+    """
+    One form POST over a fresh connection.
+
+    Returns:
+        tuple: (status, session cookie or None)
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        body = urllib.parse.urlencode(form).encode()
+        head = (
+            f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+            f'Content-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n'
+        )
+        if cookie:
+            head += f'Cookie: {cookie}\r\n'
+        writer.write((head + '\r\n').encode())
+        if slow:
+            await writer.drain()
+            await asyncio.sleep(slow)
+        writer.write(body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    lines = response.split(b'\r\n\r\n', 1)[0].decode('latin1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    session = None
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'set-cookie' and value.strip().startswith('session='):
+            session = value.strip().split(';', 1)[0]
+    return status, session
+
+
+async def wait_for_otp(email: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with CapturingSMTP.received:
+            code = CapturingSMTP.inbox.pop(email, None)
+        if code is not None:
+            return code
+        await asyncio.sleep(0.01)
+    return None
+
+
+async def drive(port: int, emails: list, concurrency: int, slow: float) -> dict:
+    latency = {'/login': [], '/verify-otp': []}
+    errors = {'/login': 0, '/verify-otp': 0}
+    limit = asyncio.Semaphore(concurrency)
+
+    async def timed(path, form, cookie=None, expect=302):
+        start = time.perf_counter()
+        try:
+            status, session = await post(port, path, form, cookie, slow)
+        except OSError:
+            status, session = 0, None
+        latency[path].append(time.perf_counter() - start)
+        if status != expect:
+            errors[path] += 1
+            return None
+        return session or cookie
+
+    async def student(email):
+        async with limit:
+            session = await timed('/login', {'email': email})
+            if session is None:
+                return False
+            code = await wait_for_otp(email)
+            if code is None:
+                errors['/verify-otp'] += 1
+                return False
+            return await timed('/verify-otp', {'otp': code}, session) is not None
+
+    logged_in = sum(await asyncio.gather(*(student(email) for email in emails)))
+    return {'latency': latency, 'errors': errors, 'logged_in': logged_in}
+
+
+def run(mode: str, emails: list, args) -> None:
+    server = asgi_server if mode == 'asgi' else wsgi_server
+    with server() as port, PeakThreads() as threads:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # the DEBUG OTP prints
+            result = asyncio.run(drive(port, emails, args.concurrency, args.slow_client))
+        wall = time.perf_counter() - start
+
+    label = 'ASGI (uvicorn)' if mode == 'asgi' else 'threaded WSGI (werkzeug)'
+    print(f"{label}: {result['logged_in']}/{len(emails)} logins in {wall:.2f}s "
+          f"({result['logged_in'] / wall:.1f} logins/s), peak threads {threads.peak}")
+    print(f"  {'endpoint':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for path, samples in result['latency'].items():
+        print(
+            f"  {path:<12} {percentile(samples, 50) * 1000:>9.1f} {percentile(samples, 95) * 1000:>9.1f} "
+            f"{percentile(samples, 99) * 1000:>9.1f} {result['errors'][path]:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=1000, help='Logins per mode')
+    parser.add_argument('--concurrency', type=int, default=500, help='Logins in flight')
+    parser.add_argument('--slow-client', type=float, default=0.0, help='Seconds between request headers and body')
+    parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+    args = parser.parse_args()
+
+    modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_database(args.students * len(modes))
+    email_queue.pool = SMTPConnectionPool('localhost', 25, smtp_class=CapturingSMTP)
+
+    print(f"{args.students} logins per mode, concurrency {args.concurrency}, slow client {args.slow_client}s\n")
+    for i, mode in enumerate(modes):
+        emails = [f'load{n}@rvce.edu.in' for n in range(i * args.students, (i + 1) * args.students)]
+        run(mode, emails, args)
+    email_queue.stop()
+
+
+if __name__ == '__main__':
+    main()
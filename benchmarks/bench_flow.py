@@ -0,0 +1,229 @@
+"""
+Login-to-ballot benchmark.
+Drives /login, /verify-otp, /vote and /admin for many simulated students
+through Flask's test client (or a real threaded WSGI server with --server)
+against a database seeded by init_db.init_database().
+
+OTP emails go through the normal outbox queue, but the SMTP pool uses
+CapturingSMTP, a fake server class that records each OTP instead of sending
+it, so the simulated students can read their codes back.
+
+Reports requests/sec, p50/p95/p99 latency and queries per request for each
+endpoint. Queries run on the serial writer thread (SQLITE_PRODUCTION) or
+the email workers are not attributed to a request.
+
+Usage:
+    python benchmarks/bench_flow.py [--students 200] [--elections 5] [--concurrency 8] [--server]
+"""
+
+import argparse
+import contextlib
+import io
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from common import CapturingSMTP, percentile, use_temp_database
+
+use_temp_database('voting-flow-')
+
+from flask import g, has_request_context, request  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import app  # noqa: E402
+from email_queue import email_queue  # noqa: E402
+from email_service import SMTPConnectionPool  # noqa: E402
+from models import db, Election, Candidate  # noqa: E402
+import init_db  # noqa: E402
+
+
+class Stats:
+    """Client-side latency and server-side query counts per endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.errors = {}
+
+    def record_latency(self, label: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.latency.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    def record_queries(self, label: str, count: int) -> None:
+        with self.lock:
+            self.queries.setdefault(label, []).append(count)
+
+
+stats = Stats()
+
+
+def install_query_hooks() -> None:
+    """Count the queries issued while handling each request."""
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def count_query(*args):
+        if has_request_context():
+            g.bench_queries = g.get('bench_queries', 0) + 1
+
+    @app.after_request
+    def record_queries(response):
+        if request.url_rule is not None:
+            stats.record_queries(f'{request.method} {request.url_rule.rule}', g.get('bench_queries', 0))
+        return response
+
+
+class TestClientDriver:
+    """One simulated browser on Flask's test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, data: dict = None) -> int:
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPDriver:
+    """One simulated browser talking HTTP to a running server."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect
+        )
+
+    def request(self, method: str, path: str, data: dict = None) -> int:
+        body = urllib.parse.urlencode(data).encode() if data else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def timed(driver, method: str, path: str, data: dict = None) -> int:
+    start = time.perf_counter()
+    status = driver.request(method, path, data)
+    stats.record_latency(f'{method} {path}', time.perf_counter() - start, status < 400)
+    return status
+
+
+def login(driver, email: str) -> bool:
+    timed(driver, 'GET', '/login')
+    timed(driver, 'POST', '/login', {'email': email})
+    code = CapturingSMTP.wait_for_otp(email)
+    if code is None:
+        return False
+    return timed(driver, 'POST', '/verify-otp', {'otp': code}) == 302
+
+
+def student_flow(driver, email: str, ballot: list) -> None:
+    if not login(driver, email):
+        return
+    timed(driver, 'GET', '/vote')
+    for election_id, candidate_id in ballot:
+        timed(driver, 'POST', '/vote', {'election_id': election_id, 'candidate_id': candidate_id})
+    timed(driver, 'GET', '/vote')
+
+
+def admin_flow(driver, views: int, done: threading.Event) -> None:
+    if not login(driver, 'admin@rvce.edu.in'):
+        return
+    for _ in range(views):
+        timed(driver, 'GET', '/admin')
+        if done.is_set():
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--elections', type=int, default=5, help='Generated elections (on top of the samples)')
+    parser.add_argument('--candidates', type=int, default=3, help='Candidates per generated election')
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated students in flight')
+    parser.add_argument('--admin-views', type=int, default=50, help='/admin loads by one admin during the run')
+    parser.add_argument('--server', action='store_true', help='Use a real threaded WSGI server')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_database(args.students, args.elections, args.candidates)
+    with app.app_context():
+        ballot = [
+            (e.id, db.session.query(Candidate.id).filter_by(election_id=e.id).first().id)
+            for e in Election.query.filter_by(is_active=True)
+        ]
+        install_query_hooks()
+    email_queue.pool = SMTPConnectionPool('localhost', 25, smtp_class=CapturingSMTP)
+
+    server = None
+    if args.server:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.port}'
+        new_driver = lambda: HTTPDriver(base_url)  # noqa: E731
+    else:
+        new_driver = TestClientDriver
+
+    emails = iter(f'load{i}@rvce.edu.in' for i in range(args.students))
+    emails_lock = threading.Lock()
+
+    def student_worker():
+        while True:
+            with emails_lock:
+                email = next(emails, None)
+            if email is None:
+                return
+            student_flow(new_driver(), email, ballot)
+
+    done = threading.Event()
+    admin = threading.Thread(target=admin_flow, args=(new_driver(), args.admin_views, done))
+    workers = [threading.Thread(target=student_worker) for _ in range(args.concurrency)]
+
+    start = time.perf_counter()
+    admin.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    done.set()
+    admin.join()
+    wall = time.perf_counter() - start
+
+    if server:
+        server.shutdown()
+    email_queue.stop()
+
+    mode = 'WSGI server' if args.server else 'test client'
+    total = sum(len(samples) for samples in stats.latency.values())
+    print(f"{args.students} students, {len(ballot)} active elections, concurrency {args.concurrency}, {mode}")
+    print(f"{total} requests in {wall:.2f}s ({total / wall:.1f} req/s)\n")
+    print(f"{'endpoint':<18} {'count':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for label in sorted(stats.latency):
+        samples = stats.latency[label]
+        queries = stats.queries.get(label, [])
+        avg_queries = sum(queries) / len(queries) if queries else 0.0
+        print(
+            f"{label:<18} {len(samples):>6} {len(samples) / wall:>8.1f} "
+            f"{percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 95) * 1000:>8.2f} "
+            f"{percentile(samples, 99) * 1000:>8.2f} {avg_queries:>8.1f} {stats.errors.get(label, 0):>7}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+OTP store benchmark.
+Simulates the login surge - generate, has-pending check and verify for many
+students on parallel threads - against each OTP store (otp_store.py) and
+reports logins/sec, latency and how many statements reached the database.
+
+The redis store runs against FakeRedis, a small in-process stand-in that
+implements the commands RedisOTPStore uses, unless --redis-url points at a
+real server.
+
+Usage:
+    python benchmarks/bench_otp_store.py [--students 2000] [--threads 8] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import threading
+import time
+
+from common import QueryCounter, percentile, use_temp_database
+
+use_temp_database('voting-otp-')
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Student, OTPCode  # noqa: E402
+from sqlite_profile import serial_writer  # noqa: E402
+import otp_store  # noqa: E402
+
+
+class FakeRedis:
+    """Thread-safe dict with expiry, speaking the subset of Redis used by RedisOTPStore."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None else str(entry[0]).encode()
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._live(key) is not None and self._data.pop(key))
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._live(key) is not None)
+
+
+def run(store_name: str, store, student_ids: list, threads: int) -> None:
+    app.extensions['otp_store'] = store
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    pending = iter(student_ids)
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    student_id = next(pending, None)
+                if student_id is None:
+                    return
+                start = time.perf_counter()
+                OTPCode.has_pending_otp(student_id)
+                code = serial_writer.run(OTPCode.generate_otp, student_id)
+                ok, message = serial_writer.run(OTPCode.verify_otp, student_id, code)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        failures.append(message)
+
+    with app.app_context(), QueryCounter(db.engine) as queries:
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        wall = time.perf_counter() - start
+
+    print(
+        f"{store_name:<8} {len(latencies) / wall:>10.1f} {percentile(latencies, 50) * 1000:>8.2f} "
+        f"{percentile(latencies, 95) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f} "
+        f"{queries.count:>9} {len(failures):>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--redis-url', default=None, help='Use a real Redis server instead of FakeRedis')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(insert(Student), [
+            {'student_id': f'OTP{i:06d}', 'email': f'otp{i}@rvce.edu.in', 'name': f'OTP {i}'}
+            for i in range(args.students)
+        ])
+        db.session.commit()
+        student_ids = [s.id for s in db.session.query(Student.id)]
+
+    if args.redis_url:
+        import redis
+        redis_client = redis.Redis.from_url(args.redis_url)
+    else:
+        redis_client = FakeRedis()
+
+    print(f"{args.students} logins on {args.threads} threads")
+    print(f"{'store':<8} {'logins/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'db stmts':>9} {'failures':>9}")
+    run('sql', otp_store.SQLOTPStore(), student_ids, args.threads)
+    run('memory', otp_store.MemoryOTPStore(), student_ids, args.threads)
+    run('redis', otp_store.RedisOTPStore(redis_client, prefix='bench-otp:'), student_ids, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Results benchmark.
+Compares the old per-election results loop (one Election lookup plus one
+aggregation over votes per election) with the batched
+get_all_election_results(), reporting query count and latency as the
+number of elections grows.
+
+Usage:
+    python benchmarks/bench_results.py [--elections 10 50 200] [--candidates 4] [--votes 200]
+"""
+
+import argparse
+import time
+
+from common import QueryCounter, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import func, insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Election, Candidate, CandidateTally, Vote  # noqa: E402
+from voting import generate_anonymous_token, get_all_election_results  # noqa: E402
+
+
+def legacy_all_election_results() -> list:
+    """The previous implementation: N+1 queries with a votes aggregation each."""
+    results = []
+    for e in Election.query.all():
+        election = db.session.get(Election, e.id)
+        rows = db.session.query(
+            Candidate.id, func.count(Vote.id).label('vote_count')
+        ).outerjoin(
+            Vote, Candidate.id == Vote.candidate_id
+        ).filter(
+            Candidate.election_id == election.id
+        ).group_by(Candidate.id).all()
+        results.append((election.id, rows))
+    return results
+
+
+def seed(elections: int, candidates: int, votes: int) -> None:
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Election), [
+        {'title': f'Election {i}', 'description': '', 'is_active': True}
+        for i in range(elections)
+    ])
+    election_ids = [e.id for e in db.session.query(Election.id)]
+    db.session.execute(insert(Candidate), [
+        {'election_id': eid, 'name': f'Candidate {eid}-{j}'}
+        for eid in election_ids for j in range(candidates)
+    ])
+    candidate_rows = db.session.query(Candidate.id, Candidate.election_id).all()
+    db.session.execute(insert(Vote), [
+        {'token': generate_anonymous_token(), 'election_id': c.election_id, 'candidate_id': c.id}
+        for c in candidate_rows for _ in range(votes // candidates)
+    ])
+    db.session.execute(insert(CandidateTally), [
+        {'candidate_id': c.id, 'election_id': c.election_id, 'vote_count': votes // candidates}
+        for c in candidate_rows
+    ])
+    db.session.commit()
+
+
+def measure(fn, repeat: int = 5) -> tuple[int, float]:
+    """Returns (queries per call, best wall time in ms)."""
+    best = float('inf')
+    queries = 0
+    for _ in range(repeat):
+        db.session.expire_all()
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        queries = counter.count
+    return queries, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--elections', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--candidates', type=int, default=4, help='Candidates per election')
+    parser.add_argument('--votes', type=int, default=200, help='Votes per election')
+    args = parser.parse_args()
+
+    print(f"{'elections':>10} {'legacy q':>9} {'legacy ms':>10} {'batched q':>10} {'batched ms':>11}")
+    with app.app_context():
+        for n in args.elections:
+            seed(n, args.candidates, args.votes)
+            legacy_q, legacy_ms = measure(legacy_all_election_results)
+            batched_q, batched_ms = measure(get_all_election_results)
+            print(f"{n:>10} {legacy_q:>9} {legacy_ms:>10.2f} {batched_q:>10} {batched_ms:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
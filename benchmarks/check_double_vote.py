@@ -0,0 +1,129 @@
+"""
+Concurrent double-vote check.
+Fires many simultaneous submissions for the same student and election (as
+double-clicks or load-balancer retries would) through cast_vote() and
+cast_ballot(), and verifies that exactly one ballot is recorded, every other
+attempt gets the "already voted" result, and the tally matches the votes
+table.
+
+Honours VOTE_SHARDING, so each ballot layout can be checked.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    [VOTE_SHARDING=tables|files] python benchmarks/check_double_vote.py [--threads 16] [--rounds 20]
+"""
+
+import argparse
+import sys
+import threading
+from collections import Counter
+
+from common import use_temp_database
+
+use_temp_database('voting-race-')
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Student, Election, Candidate, CandidateTally  # noqa: E402
+from vote_shards import vote_shards  # noqa: E402
+from voting import ALREADY_VOTED, cast_ballot, cast_vote, reconcile_tallies  # noqa: E402
+
+
+def race(threads: int, submit) -> Counter:
+    """Run `submit()` on `threads` threads released at the same instant."""
+    barrier = threading.Barrier(threads)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def attempt():
+        with app.app_context():
+            barrier.wait()
+            outcome = submit()
+        with lock:
+            outcomes[outcome] += 1
+
+    workers = [threading.Thread(target=attempt) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='Parallel submissions per round')
+    parser.add_argument('--rounds', type=int, default=20, help='Students (one race each) per API')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        vote_shards.drop_all()
+        db.create_all()
+        db.session.execute(insert(Student), [
+            {'student_id': f'RACE{i:04d}', 'email': f'race{i}@rvce.edu.in', 'name': f'Race {i}'}
+            for i in range(args.rounds * 2)
+        ])
+        db.session.execute(insert(Election), [
+            {'title': 'Race A', 'is_active': True},
+            {'title': 'Race B', 'is_active': True}
+        ])
+        db.session.execute(insert(Candidate), [
+            {'election_id': 1, 'name': 'A1'},
+            {'election_id': 2, 'name': 'B1'}
+        ])
+        db.session.execute(insert(CandidateTally), [
+            {'candidate_id': 1, 'election_id': 1, 'vote_count': 0},
+            {'candidate_id': 2, 'election_id': 2, 'vote_count': 0}
+        ])
+        db.session.commit()
+        # Ballots are only written to existing shards (VOTE_SHARDING)
+        vote_shards.create_all()
+
+    failures = []
+    for round_no in range(args.rounds):
+        student_id = round_no + 1
+        outcomes = race(args.threads, lambda: cast_vote(student_id, 1, 1))
+        successes = sum(n for (ok, _), n in outcomes.items() if ok)
+        others = {message for (ok, message), _ in outcomes.items() if not ok}
+        if successes != 1 or others - {ALREADY_VOTED}:
+            failures.append(f"cast_vote student {student_id}: {dict(outcomes)}")
+
+    for round_no in range(args.rounds):
+        student_id = args.rounds + round_no + 1
+
+        def submit_ballot():
+            success, reasons = cast_ballot(student_id, {1: 1, 2: 2})
+            return success, tuple(sorted(reasons.items()))
+
+        outcomes = race(args.threads, submit_ballot)
+        successes = sum(n for (ok, _), n in outcomes.items() if ok)
+        others = {reason for (ok, reasons), _ in outcomes.items() if not ok for _, reason in reasons}
+        if successes != 1 or others - {ALREADY_VOTED}:
+            failures.append(f"cast_ballot student {student_id}: {dict(outcomes)}")
+
+    with app.app_context():
+        tokens = votes = 0
+        for shard, _ in vote_shards.group():
+            tokens += shard.execute(select(func.count()).select_from(shard.tokens)).scalar()
+            votes += shard.execute(select(func.count()).select_from(shard.votes)).scalar()
+        drift = reconcile_tallies()
+
+    expected = args.rounds * 3  # one vote per cast_vote race, two per cast_ballot race
+    if tokens != expected or votes != expected:
+        failures.append(f"expected {expected} tokens and votes, found {tokens} tokens and {votes} votes")
+    if drift:
+        failures.append(f"tally drift: {drift}")
+
+    print(f"{args.rounds * 2} races x {args.threads} parallel submissions: "
+          f"{tokens} vote tokens, {votes} votes")
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    print("✓ Exactly one ballot per student and election; all duplicates reported as already voted.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Email queue delivery check.
+Runs the outbox (email_queue.py) against a local stand-in SMTP server on
+127.0.0.1 and verifies that:
+
+- every queued OTP is delivered once, over pooled connections, with the code
+  in the body and not in the subject;
+- a transient failure (451) is retried and then delivered;
+- a refused recipient (550) fails at once;
+- a message still undelivered after EMAIL_EXPIRY_MINUTES is expired unsent;
+- no finished outbox row keeps its body.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python benchmarks/check_email_queue.py [--messages 50]
+"""
+
+import argparse
+import email
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from email.header import decode_header, make_header
+
+from common import use_temp_database
+
+use_temp_database('voting-email-')
+
+from app import app  # noqa: E402
+from models import db, OutboxEmail  # noqa: E402
+from email_queue import email_queue  # noqa: E402
+from email_service import SMTPConnectionPool  # noqa: E402
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    The part of SMTP that smtplib uses without TLS or AUTH. Recipients named
+    reject@... are refused, and the first message to flaky@... gets a 451.
+    """
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        recipients = []
+        self.reply('220 localhost stand-in SMTP')
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip('<> ')
+                if address.startswith('reject@'):
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with server.lock:
+                    if 'flaky@rvce.edu.in' in recipients and not server.flaked:
+                        server.flaked = True
+                        self.reply('451 Try again later')
+                        continue
+                    for address in recipients:
+                        server.received.append((address, email.message_from_bytes(b''.join(data))))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.received = []
+        self.flaked = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=50, help='OTP emails to queue')
+    args = parser.parse_args()
+
+    smtp = StandInSMTPServer()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    pool = SMTPConnectionPool('127.0.0.1', smtp.server_address[1], use_tls=False, size=2, timeout=5)
+    app.config['EMAIL_QUEUE_ENABLED'] = True
+    app.config['EMAIL_RETRY_BACKOFF_SECONDS'] = 0
+    email_queue.pool = pool
+
+    codes = {f'student{i}@rvce.edu.in': f'{100000 + i}' for i in range(args.messages)}
+    codes['flaky@rvce.edu.in'] = '222222'
+    codes['reject@rvce.edu.in'] = '333333'
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Queued long ago, e.g. while the SMTP server was down: its OTP is dead
+        stale = OutboxEmail(
+            to_email='stale@rvce.edu.in', subject='🔐 Your Voting OTP', text_body='444444',
+            created_at=datetime.utcnow() - timedelta(minutes=app.config['EMAIL_EXPIRY_MINUTES'] + 1)
+        )
+        db.session.add(stale)
+        db.session.commit()
+        for address, code in codes.items():
+            email_queue.enqueue_otp_email(address, code, 'Student')
+
+        deadline = time.monotonic() + 30
+        while OutboxEmail.query.filter(OutboxEmail.status.in_(('pending', 'sending'))).count():
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        rows = {row.to_email: row for row in OutboxEmail.query}
+        db.session.remove()
+    email_queue.stop()
+    smtp.shutdown()
+
+    failures = []
+    delivered = {}
+    for address, msg in smtp.received:
+        text = msg.get_payload(0).get_payload(decode=True).decode()
+        delivered.setdefault(address, []).append(text)
+        if any(ch.isdigit() for ch in str(make_header(decode_header(msg['Subject'])))):
+            failures.append(f"subject of the message to {address} contains digits: {msg['Subject']!r}")
+
+    for address, code in codes.items():
+        expected = 0 if address.startswith('reject@') else 1
+        texts = delivered.get(address, [])
+        if len(texts) != expected or (texts and code not in texts[0]):
+            failures.append(f"{address}: expected {expected} message with {code}, got {len(texts)}")
+    if 'stale@rvce.edu.in' in delivered:
+        failures.append("the expired message was delivered")
+
+    expected_status = {'flaky@rvce.edu.in': 'sent', 'reject@rvce.edu.in': 'failed', 'stale@rvce.edu.in': 'expired'}
+    for address, row in rows.items():
+        status = expected_status.get(address, 'sent')
+        if row.status != status:
+            failures.append(f"{address}: status {row.status}, expected {status}")
+        if row.text_body or row.html_body:
+            failures.append(f"{address}: {row.status} row still holds its body")
+    if rows['flaky@rvce.edu.in'].attempts != 2:
+        failures.append(f"flaky@rvce.edu.in: {rows['flaky@rvce.edu.in'].attempts} attempts, expected 2")
+
+    print(f"{len(rows)} queued emails: {len(smtp.received)} delivered "
+          f"over {pool.connections_opened} SMTP connections")
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    print("✓ Delivered once each, retried the 451, failed the 550, expired the stale one; no bodies kept.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Importing this module puts the project root on sys.path. Scripts that need
+a throwaway database call use_temp_database() before importing app.
+"""
+
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def use_temp_database(prefix: str = 'voting-bench-', database_url: str = None) -> str:
+    """
+    Point DATABASE_URL at `database_url` or a fresh SQLite file, and give the
+    run an OTP hash key if the environment has none. Call before importing app.
+    """
+    os.environ.setdefault('OTP_HASH_KEY', secrets.token_hex(32))
+    os.environ['DATABASE_URL'] = database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix=prefix), 'bench.db'
+    )
+    return os.environ['DATABASE_URL']
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class QueryCounter:
+    """Counts statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+class CapturingSMTP:
+    """Stand-in SMTP server class that keeps the OTP of every message it is given."""
+
+    inbox = {}
+    received = threading.Condition()
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        text = msg.get_payload(0).get_payload(decode=True).decode()
+        code = re.search(r'(\d{6})', text).group(1)
+        with CapturingSMTP.received:
+            CapturingSMTP.inbox[str(msg['To'])] = code
+            CapturingSMTP.received.notify_all()
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+    @classmethod
+    def wait_for_otp(cls, email: str, timeout: float = 10):
+        with cls.received:
+            cls.received.wait_for(lambda: email in cls.inbox, timeout)
+            return cls.inbox.pop(email, None)
@@ -0,0 +1,147 @@
+"""
+Multi-threaded voting load harness.
+Runs the login-to-ballot flow (OTP generate + verify, voted-election lookup,
+one ballot per election) for many students in parallel threads against a
+local database, with periodic results reads in between, and reports
+throughput, latency, errors and connection pool metrics.
+
+Uses a throwaway SQLite file unless --database-url is given, e.g.
+    python benchmarks/load_voting.py --database-url postgresql://localhost/voting_load
+
+The pool preset, profile and vote storage come from the environment as
+usual (DB_POOL_PRESET, DB_POOL_SIZE, SQLITE_PRODUCTION, VOTE_SHARDING, ...).
+
+Usage:
+    python benchmarks/load_voting.py [--students 500] [--elections 5] [--threads 16]
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from common import percentile, use_temp_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--elections', type=int, default=5)
+    parser.add_argument('--candidates', type=int, default=3, help='Candidates per election')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--database-url', default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    use_temp_database('voting-load-', args.database_url)
+
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Student, Election, Candidate, OTPCode
+    from pool_metrics import pool_metrics, pool_status
+    from sqlite_profile import serial_writer
+    from vote_shards import vote_shards
+    from voting import cast_vote, get_voted_election_ids, get_all_election_results
+
+    with app.app_context():
+        db.drop_all()
+        vote_shards.drop_all()
+        db.create_all()
+        db.session.execute(insert(Student), [
+            {'student_id': f'LOAD{i:06d}', 'email': f'load{i}@rvce.edu.in', 'name': f'Load {i}'}
+            for i in range(args.students)
+        ])
+        db.session.execute(insert(Election), [
+            {'title': f'Election {i}', 'description': '', 'is_active': True}
+            for i in range(args.elections)
+        ])
+        election_ids = [e.id for e in db.session.query(Election.id)]
+        db.session.execute(insert(Candidate), [
+            {'election_id': eid, 'name': f'Candidate {eid}-{j}'}
+            for eid in election_ids for j in range(args.candidates)
+        ])
+        candidates = {}
+        for c in db.session.query(Candidate.id, Candidate.election_id):
+            candidates.setdefault(c.election_id, []).append(c.id)
+        db.session.commit()
+        vote_shards.create_all()
+        for eid, ids in candidates.items():
+            shard = vote_shards.get(eid)
+            shard.execute(insert(shard.tallies), [
+                {'candidate_id': cid, 'election_id': eid, 'vote_count': 0} for cid in ids
+            ])
+        db.session.commit()
+        student_ids = [s.id for s in db.session.query(Student.id)]
+
+    pool_metrics.reset()
+    latencies = {}
+    errors = []
+    lock = threading.Lock()
+    next_student = iter(student_ids)
+
+    def timed(name, fn, *fn_args):
+        start = time.perf_counter()
+        result = fn(*fn_args)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.setdefault(name, []).append(elapsed)
+        return result
+
+    def worker():
+        while True:
+            with lock:
+                student_id = next(next_student, None)
+            if student_id is None:
+                return
+            with app.app_context():
+                try:
+                    code = timed('generate_otp', serial_writer.run, OTPCode.generate_otp, student_id)
+                    ok, message = timed('verify_otp', serial_writer.run, OTPCode.verify_otp, student_id, code)
+                    if not ok:
+                        errors.append(message)
+                    voted = timed('voted_lookup', get_voted_election_ids, student_id, election_ids)
+                    for eid in election_ids:
+                        if eid in voted:
+                            continue
+                        cid = candidates[eid][student_id % len(candidates[eid])]
+                        ok, message = timed(
+                            'cast_vote', serial_writer.run_in_lane, vote_shards.lane(eid), cast_vote, student_id, eid, cid
+                        )
+                        if not ok:
+                            errors.append(message)
+                    if student_id % 10 == 0:
+                        timed('results', get_all_election_results)
+                except Exception as e:
+                    errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    with app.app_context():
+        total_votes = sum(r['total_votes'] for r in get_all_election_results())
+        status = pool_status(db.engine)
+
+    print(f"Database: {os.environ['DATABASE_URL']} (vote sharding: {vote_shards.mode or 'off'})")
+    print(f"{args.students} students x {args.elections} elections on {args.threads} threads in {wall:.2f}s")
+    print(f"Ballots recorded: {total_votes} (expected {args.students * args.elections}), errors: {len(errors)}")
+    for message in sorted(set(errors))[:5]:
+        print(f"  {message}")
+    print(f"\n{'operation':<14} {'count':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, samples in latencies.items():
+        print(
+            f"{name:<14} {len(samples):>7} {len(samples) / wall:>9.1f} "
+            f"{percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 95) * 1000:>8.2f} "
+            f"{percentile(samples, 99) * 1000:>8.2f}"
+        )
+    print(f"\nPool: {status}")
+
+
+if __name__ == '__main__':
+    main()
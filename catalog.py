@@ -0,0 +1,105 @@
+"""
+Cached catalog of active elections.
+
+Elections and candidates only change through the admin routes, yet every
+/vote page and every ballot needs them. The catalog keeps an immutable
+snapshot of the active elections, their candidates and candidate id sets in
+memory. Admin routes call election_catalog.invalidate() after committing a
+change, which bumps the catalog version and forces a reload on next use.
+
+The cache is per process: other worker processes reload when their snapshot
+is older than CATALOG_TTL_SECONDS. It builds the voting page and turns away
+invalid ballots early, but cast_vote/cast_ballot authorise every accepted
+ballot against the database before committing it.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from models import db, Election, Candidate
+
+
+CatalogCandidate = namedtuple('CatalogCandidate', ['id', 'election_id', 'name', 'description'])
+CatalogElection = namedtuple('CatalogElection', ['id', 'title', 'description', 'is_active', 'candidates', 'candidate_ids'])
+
+
+class CatalogSnapshot:
+    """Active elections as loaded at one catalog version."""
+
+    def __init__(self, version: int, elections: tuple):
+        self.version = version
+        self.elections = elections
+        self.by_id = {e.id: e for e in elections}
+        self.loaded_at = time.monotonic()
+
+    def get(self, election_id: int) -> CatalogElection:
+        """The active election with this id, or None."""
+        return self.by_id.get(election_id)
+
+
+class ElectionCatalog:
+    """Versioned in-process cache of the active elections."""
+
+    def __init__(self, ttl: float = 30):
+        self.ttl = ttl
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('CATALOG_TTL_SECONDS', self.ttl)
+        app.extensions['election_catalog'] = self
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> CatalogSnapshot:
+        """Current snapshot, reloading it if invalidated or expired. Needs an app context."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+            return snapshot
+
+        version = self._version
+        snapshot = CatalogSnapshot(version, self._load())
+        with self._lock:
+            # Don't store a snapshot that an invalidation overtook while loading
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Drop the snapshot; call after committing any election or candidate change."""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def _load(self) -> tuple:
+        candidates = {}
+        for c in db.session.query(
+            Candidate.id, Candidate.election_id, Candidate.name, Candidate.description
+        ).join(
+            Election, Election.id == Candidate.election_id
+        ).filter(
+            Election.is_active == True
+        ).order_by(Candidate.id):
+            candidates.setdefault(c.election_id, []).append(
+                CatalogCandidate(c.id, c.election_id, c.name, c.description)
+            )
+
+        return tuple(
+            CatalogElection(
+                id=e.id,
+                title=e.title,
+                description=e.description,
+                is_active=True,
+                candidates=tuple(candidates.get(e.id, ())),
+                candidate_ids=frozenset(c.id for c in candidates.get(e.id, ()))
+            )
+            for e in db.session.query(
+                Election.id, Election.title, Election.description
+            ).filter(Election.is_active == True).order_by(Election.id)
+        )
+
+
+election_catalog = ElectionCatalog()
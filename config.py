@@ -1,5 +1,58 @@
 import os
 import secrets
+from pool_metrics import MeteredQueuePool
+
+
+# Connection pool presets, selected with DB_POOL_PRESET. Individual values
+# can be overridden with DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE and DB_POOL_PRE_PING.
+DB_POOL_PRESETS = {
+    'development': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+    },
+    'production': {
+        'pool_size': 20,          # Steady-state connections per worker process
+        'max_overflow': 10,       # Extra connections allowed during bursts
+        'pool_timeout': 10,       # Seconds to wait for a free connection
+        'pool_recycle': 1800,     # Reconnect before server-side idle timeouts
+        'pool_pre_ping': True,    # Detect connections dropped by the server
+    },
+    'testing': {
+        'pool_size': 2,
+        'max_overflow': 0,
+        'pool_timeout': 5,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+    },
+}
+
+
+def engine_options(database_uri: str) -> dict:
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the selected pool preset."""
+    # In-memory SQLite shares one connection per thread; pool sizing does not apply
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    
+    options = dict(DB_POOL_PRESETS[os.environ.get('DB_POOL_PRESET') or 'development'])
+    overrides = {
+        'pool_size': ('DB_POOL_SIZE', int),
+        'max_overflow': ('DB_MAX_OVERFLOW', int),
+        'pool_timeout': ('DB_POOL_TIMEOUT', float),
+        'pool_recycle': ('DB_POOL_RECYCLE', int),
+        'pool_pre_ping': ('DB_POOL_PRE_PING', lambda value: value == '1'),
+    }
+    for key, (env_var, cast) in overrides.items():
+        if os.environ.get(env_var):
+            options[key] = cast(os.environ[env_var])
+    
+    # Records checkout wait times for /admin/stats/pool
+    options['poolclass'] = MeteredQueuePool
+    return options
+
 
 class Config:
     """Application configuration settings."""
@@ -12,12 +65,77 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(BASEDIR, 'voting.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # SQLite production profile (see sqlite_profile.py): WAL journal, tuned
+    # pragmas and a single writer thread for ballots and OTPs
+    SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '0') == '1'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',        # Readers no longer block the writer (and vice versa)
+        'synchronous': 'NORMAL',      # Safe with WAL; fsync at checkpoints only
+        'busy_timeout': 5000,         # ms to wait for a lock before "database is locked"
+        'cache_size': -65536,         # Negative = KiB, i.e. 64 MB page cache per connection
+        'mmap_size': 268435456,       # 256 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+    }
+    
+    # ASGI serving mode (asgi.py): Flask views run on these thread pools
+    # while connections wait on the event loop. Keep ASGI_AUTH_THREADS at or
+    # below the database pool size
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS') or 32)
+    ASGI_AUTH_THREADS = int(os.environ.get('ASGI_AUTH_THREADS') or 8)
+    ASGI_MAX_PENDING_LOGINS = int(os.environ.get('ASGI_MAX_PENDING_LOGINS') or 5000)  # then 503
+    
+    # Per-request SQL profiling (see profiling.py), off by default. Reports
+    # at /admin/stats/sql and as one 'sql_profile' log line per request
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', '0') == '1'
+    SQL_PROFILING_SLOWEST = 5     # Slowest statements kept per endpoint
+    SQL_SLOW_QUERY_MS = int(os.environ.get('SQL_SLOW_QUERY_MS') or 100)  # Log statements slower than this
     
     # Session configuration
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Logged-in users are cached in-process for this long instead of being
+    # reloaded from the database on every request
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS') or 30)
+    USER_CACHE_MAX_ENTRIES = 10000
+    
+    # Active elections and candidates are cached in-process. Admin changes
+    # invalidate the cache at once in the process that made them; other
+    # worker processes pick them up within this many seconds
+    CATALOG_TTL_SECONDS = int(os.environ.get('CATALOG_TTL_SECONDS') or 30)
+    
+    # Results of active elections are cached this long. Closed elections are
+    # cached until an admin changes them in this process, or at most
+    # RESULTS_CACHE_CLOSED_TTL_SECONDS, which bounds how long other worker
+    # processes serve deleted elections and candidates; see results_cache.py
+    RESULTS_CACHE_TTL_SECONDS = float(os.environ.get('RESULTS_CACHE_TTL_SECONDS') or 5)
+    RESULTS_CACHE_CLOSED_TTL_SECONDS = float(os.environ.get('RESULTS_CACHE_CLOSED_TTL_SECONDS') or 60)
+    
+    # Public results API (/api/results): how long clients and proxies may
+    # reuse a response before revalidating it
+    PUBLIC_RESULTS_MAX_AGE = int(os.environ.get('PUBLIC_RESULTS_MAX_AGE') or 60)
+    
+    # Live results stream (/admin/results/stream). Votes from other worker
+    # processes reach the stream within RESULTS_STREAM_POLL_SECONDS
+    RESULTS_STREAM_POLL_SECONDS = float(os.environ.get('RESULTS_STREAM_POLL_SECONDS') or 2)
+    RESULTS_STREAM_COALESCE_SECONDS = 0.25  # batch ballots arriving together into one update
+    RESULTS_STREAM_HEARTBEAT_SECONDS = 15
+    RESULTS_STREAM_MAX_QUEUED = 100  # events a slow client may fall behind before being reset
+    
+    # Per-election vote storage (see vote_shards.py): '' keeps all ballots in
+    # the shared tables, 'tables' gives each election its own tables and
+    # 'files' (SQLite) its own database file, so elections commit in parallel
+    VOTE_SHARDING = os.environ.get('VOTE_SHARDING') or ''
+    VOTE_SHARD_DIR = os.environ.get('VOTE_SHARD_DIR')  # default: '<database>-shards' next to the SQLite file
+    VOTE_SHARD_WRITERS = int(os.environ.get('VOTE_SHARD_WRITERS') or 4)  # writer threads for shard files
+    
+    # Admin dashboard and /admin/api/* pagination
+    ADMIN_PAGE_SIZE = 50
+    ADMIN_PAGE_MAX = 500
+    
     # ==================== SMTP EMAIL CONFIGURATION ====================
     # Configure these settings to enable email OTP
     
@@ -33,5 +151,47 @@ class Config:
     SMTP_USER = os.environ.get('SMTP_USER') or 'shaikmaaz77zz@gmail.com'
     SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD') or 'ouay egsd huek vyev'
     
+    # ==================== EMAIL DELIVERY QUEUE ====================
+    # OTP emails are written to a persistent outbox and delivered by
+    # background workers over a pool of reusable SMTP connections.
+    # Set EMAIL_QUEUE_ENABLED=0 to send synchronously from the request.
+    
+    EMAIL_QUEUE_ENABLED = os.environ.get('EMAIL_QUEUE_ENABLED', '1') == '1'
+    EMAIL_QUEUE_WORKERS = int(os.environ.get('EMAIL_QUEUE_WORKERS') or 2)
+    EMAIL_QUEUE_POLL_SECONDS = 5          # Idle workers re-check the outbox this often
+    EMAIL_MAX_ATTEMPTS = 5                # Give up (status 'failed') after this many tries
+    EMAIL_RETRY_BACKOFF_SECONDS = 2       # First retry delay; doubles on every attempt
+    EMAIL_SEND_LEASE_SECONDS = 120        # Claimed rows are retried if not finished in time
+    EMAIL_EXPIRY_MINUTES = 5              # Undelivered mail is dropped once its OTP has expired
+    # Finished (sent, failed, expired) outbox rows are deleted after this
+    # many days by the OTP sweeper
+    EMAIL_RETENTION_DAYS = float(os.environ.get('EMAIL_RETENTION_DAYS') or 7)
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE') or 2)
+    SMTP_CONNECTION_MAX_AGE = 300         # Seconds before a pooled connection is recycled
+    
     # OTP Settings
     OTP_EXPIRY_MINUTES = 5
+    
+    # Where pending OTPs are kept (see otp_store.py): 'sql' (otp_codes table),
+    # 'memory' (single server process only) or 'redis' (OTP_REDIS_URL)
+    OTP_STORE = os.environ.get('OTP_STORE') or 'sql'
+    OTP_STORE_MAX_ENTRIES = int(os.environ.get('OTP_STORE_MAX_ENTRIES') or 100000)  # memory store bound
+    OTP_REDIS_URL = os.environ.get('OTP_REDIS_URL') or 'redis://localhost:6379/0'
+    OTP_REDIS_PREFIX = 'otp:'
+    
+    # Key for the OTP hashes kept by the OTP store. It must be the same in
+    # every process (web workers, CLI pre-warm), so it is taken from the
+    # environment or, if neither is set, generated once and kept in
+    # instance/otp_hash_key (see otp_store.instance_hash_key)
+    OTP_HASH_KEY = os.environ.get('OTP_HASH_KEY') or os.environ.get('SECRET_KEY') or ''
+    
+    # Expired and used OTPs are deleted in batches every OTP_SWEEP_INTERVAL_SECONDS
+    # by a background thread (0 disables it; `flask sweep-otps` does the same once)
+    OTP_SWEEP_INTERVAL_SECONDS = int(os.environ.get('OTP_SWEEP_INTERVAL_SECONDS') or 300)
+    OTP_SWEEP_BATCH_SIZE = 1000
+    
+    # Pre-warmed OTPs are mailed ahead of an election opening, so they
+    # need to stay valid until students actually log in
+    OTP_PREWARM_EXPIRY_MINUTES = int(os.environ.get('OTP_PREWARM_EXPIRY_MINUTES') or 120)
+    OTP_PREWARM_SESSIONS = 4              # Parallel SMTP sessions used for a pre-warm run
+    OTP_PREWARM_BATCH_SIZE = 200          # Students per OTP insert / SMTP batch
@@ -0,0 +1,257 @@
+"""
+Email Delivery Queue
+Delivers outgoing emails in the background through a persistent outbox.
+
+Request handlers call enqueue_otp_email(), which only writes a row to the
+email_outbox table and wakes the workers - no SMTP traffic happens on the
+request thread. Worker threads claim due rows, send them over a shared pool
+of authenticated SMTP connections and retry failures with exponential backoff.
+
+Message bodies carry the OTP, so they are cleared once a row is finished:
+sent, failed, or expired (still undelivered after EMAIL_EXPIRY_MINUTES, when
+the code it carries no longer works). Finished rows are deleted after
+EMAIL_RETENTION_DAYS by purge_finished(), which the OTP sweeper runs.
+"""
+
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from models import db, OutboxEmail
+from email_service import SMTPConnectionPool, build_message, render_otp_email, send_otp_email
+
+
+# Errors that will not go away by retrying the same message
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+class EmailQueue:
+    """Outbox-backed email queue with background delivery workers."""
+
+    def __init__(self, app=None, pool=None):
+        self.app = None
+        self.pool = pool
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, pool=None):
+        """Bind the queue to a Flask app. Workers start on first use."""
+        self.app = app
+        if pool is not None:
+            self.pool = pool
+        if self.pool is None:
+            self.pool = SMTPConnectionPool.from_config(app.config)
+        app.extensions['email_queue'] = self
+
+    # ==================== PRODUCER SIDE ====================
+
+    def enqueue(self, to_email: str, subject: str, text_body: str, html_body: str = None) -> int:
+        """Store a message in the outbox and wake a worker. Returns the outbox id."""
+        email = OutboxEmail(
+            to_email=to_email,
+            subject=subject,
+            text_body=text_body,
+            html_body=html_body
+        )
+        db.session.add(email)
+        db.session.commit()
+
+        self.start()
+        self._wakeup.set()
+        return email.id
+
+    def enqueue_otp_email(self, to_email: str, otp_code: str, student_name: str) -> tuple[bool, str]:
+        """
+        Queue an OTP email for background delivery.
+
+        Mirrors send_otp_email() so routes can switch between the two. When
+        EMAIL_QUEUE_ENABLED is off the email is sent synchronously instead.
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if not self.app.config.get('EMAIL_QUEUE_ENABLED', True):
+            return send_otp_email(to_email, otp_code, student_name)
+
+        try:
+            self.enqueue(to_email, *render_otp_email(otp_code, student_name))
+            return True, "OTP queued for delivery."
+        except Exception as e:
+            db.session.rollback()
+            return False, f"Error: {str(e)}"
+
+    # ==================== WORKERS ====================
+
+    def start(self) -> None:
+        """Start the worker threads (once per process, so forked workers get their own)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._threads = []
+            for i in range(self.app.config.get('EMAIL_QUEUE_WORKERS', 2)):
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    name=f'email-queue-{i}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop the workers and close pooled SMTP connections."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
+        self.pool.close()
+
+    def _run_worker(self) -> None:
+        poll_seconds = self.app.config.get('EMAIL_QUEUE_POLL_SECONDS', 5)
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    delivered = self.process_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception('Email queue worker error: %s', e)
+                    delivered = 0
+                finally:
+                    db.session.remove()
+
+                if not delivered:
+                    self._wakeup.wait(poll_seconds)
+                    self._wakeup.clear()
+
+    def process_pending(self, limit: int = 50) -> int:
+        """
+        Deliver up to `limit` due messages on the calling thread.
+
+        Must run inside an app context. Returns the number of messages
+        attempted (successfully or not).
+        """
+        now = datetime.utcnow()
+        self.expire_stale(now)
+        due_ids = [
+            row.id for row in db.session.query(OutboxEmail.id).filter(
+                OutboxEmail.status.in_(('pending', 'sending')),
+                OutboxEmail.next_attempt_at <= now
+            ).order_by(OutboxEmail.id).limit(limit)
+        ]
+
+        attempted = 0
+        for email_id in due_ids:
+            if self._claim(email_id, now):
+                self._deliver(email_id)
+                attempted += 1
+        return attempted
+
+    def expire_stale(self, now: datetime = None) -> int:
+        """
+        Give up on due messages older than EMAIL_EXPIRY_MINUTES and clear
+        their bodies. Returns the number of messages expired.
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(minutes=self.app.config.get('EMAIL_EXPIRY_MINUTES', 5))
+        result = db.session.execute(
+            update(OutboxEmail).where(
+                OutboxEmail.status.in_(('pending', 'sending')),
+                OutboxEmail.next_attempt_at <= now,
+                OutboxEmail.created_at < cutoff
+            ).values(status='expired', text_body='', html_body=None)
+        )
+        db.session.commit()
+        if result.rowcount:
+            self.app.logger.warning('Expired %d undelivered emails', result.rowcount)
+        return result.rowcount
+
+    def purge_finished(self, batch_size: int = 1000) -> int:
+        """
+        Delete sent, failed and expired messages older than
+        EMAIL_RETENTION_DAYS, in batches. Returns the number deleted.
+
+        Age is taken from next_attempt_at, the time of the last attempt
+        (plus the send lease), which the status index covers.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.app.config.get('EMAIL_RETENTION_DAYS', 7))
+        deleted = 0
+        while True:
+            ids = select(OutboxEmail.id).where(
+                OutboxEmail.status.in_(('sent', 'failed', 'expired')),
+                OutboxEmail.next_attempt_at < cutoff
+            ).limit(batch_size)
+            count = db.session.execute(
+                delete(OutboxEmail).where(OutboxEmail.id.in_(ids.scalar_subquery()))
+            ).rowcount
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+    def _claim(self, email_id: int, now: datetime) -> bool:
+        """
+        Atomically take ownership of a due message.
+
+        Moving next_attempt_at into the future acts as a lease: other workers
+        (and other processes) skip the row, and if this worker dies mid-send
+        the row becomes due again once the lease runs out.
+        """
+        lease = timedelta(seconds=self.app.config.get('EMAIL_SEND_LEASE_SECONDS', 120))
+        result = db.session.execute(
+            update(OutboxEmail).where(
+                OutboxEmail.id == email_id,
+                OutboxEmail.status.in_(('pending', 'sending')),
+                OutboxEmail.next_attempt_at <= now
+            ).values(
+                status='sending',
+                attempts=OutboxEmail.attempts + 1,
+                next_attempt_at=now + lease
+            )
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _deliver(self, email_id: int) -> None:
+        email = db.session.get(OutboxEmail, email_id)
+        msg = build_message(email.to_email, email.subject, email.text_body, email.html_body)
+
+        try:
+            self.pool.send_message(msg)
+        except Exception as e:
+            max_attempts = self.app.config.get('EMAIL_MAX_ATTEMPTS', 5)
+            email.last_error = str(e)
+            if isinstance(e, PERMANENT_ERRORS) or email.attempts >= max_attempts:
+                email.status = 'failed'
+                email.text_body = ''
+                email.html_body = None
+                self.app.logger.error('Giving up on email %s to %s: %s', email.id, email.to_email, e)
+            else:
+                backoff = self.app.config.get('EMAIL_RETRY_BACKOFF_SECONDS', 2) * 2 ** (email.attempts - 1)
+                email.status = 'pending'
+                email.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+        else:
+            email.status = 'sent'
+            email.sent_at = datetime.utcnow()
+            email.text_body = ''
+            email.html_body = None
+            email.last_error = None
+        db.session.commit()
+
+
+email_queue = EmailQueue()
+
+
+def enqueue_otp_email(to_email: str, otp_code: str, student_name: str) -> tuple[bool, str]:
+    """Queue an OTP email on the application's email queue."""
+    return email_queue.enqueue_otp_email(to_email, otp_code, student_name)
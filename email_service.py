@@ -5,48 +5,44 @@ Sends OTP codes via SMTP email.
 Configure your SMTP settings in config.py before using.
 """
 
+import queue
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import Config
 
 
-def send_otp_email(to_email: str, otp_code: str, student_name: str) -> tuple[bool, str]:
+def render_otp_email(otp_code: str, student_name: str, expiry_minutes: int = 5) -> tuple[str, str, str]:
     """
-    Send OTP code to student's email.
-    
-    Args:
-        to_email: Student's email address
-        otp_code: 6-digit OTP code
-        student_name: Student's name for personalization
+    Render the OTP email content.
     
     Returns:
-        tuple: (success: bool, message: str)
+        tuple: (subject, text_body, html_body)
     """
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f'🔐 Your Voting OTP: {otp_code}'
-        msg['From'] = f"Voting System <{Config.SMTP_USER}>"
-        msg['To'] = to_email
-        
-        # Plain text version
-        text_content = f"""
+    # The code stays out of the subject: subjects show up in inbox previews
+    # and are kept in the outbox after delivery
+    subject = '🔐 Your Voting OTP'
+    
+    # Plain text version
+    text_content = f"""
 Hello {student_name},
 
 Your one-time password (OTP) for the Student Voting System is:
 
     {otp_code}
 
-This code will expire in 5 minutes.
+This code will expire in {expiry_minutes} minutes.
 
 If you did not request this code, please ignore this email.
 
 - Student Voting System
 """
-        
-        # HTML version
-        html_content = f"""
+    
+    # HTML version
+    html_content = f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -73,15 +69,46 @@ If you did not request this code, please ignore this email.
         <div class="otp-box">
             <div class="otp-code">{otp_code}</div>
         </div>
-        <p class="info">This code will expire in <strong>5 minutes</strong>.</p>
+        <p class="info">This code will expire in <strong>{expiry_minutes} minutes</strong>.</p>
         <p class="warning">⚠️ If you did not request this code, please ignore this email.</p>
     </div>
 </body>
 </html>
 """
-        
-        msg.attach(MIMEText(text_content, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
+    
+    return subject, text_content, html_content
+
+
+def build_message(to_email: str, subject: str, text_body: str, html_body: str = None) -> MIMEMultipart:
+    """Build a multipart (plain text + HTML) message ready for sending."""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"Voting System <{Config.SMTP_USER}>"
+    msg['To'] = to_email
+    
+    msg.attach(MIMEText(text_body, 'plain'))
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+def send_otp_email(to_email: str, otp_code: str, student_name: str) -> tuple[bool, str]:
+    """
+    Send OTP code to student's email.
+    
+    Opens a dedicated SMTP connection for this single message. The login
+    routes deliver through the background queue in email_queue.py instead.
+    
+    Args:
+        to_email: Student's email address
+        otp_code: 6-digit OTP code
+        student_name: Student's name for personalization
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    try:
+        msg = build_message(to_email, *render_otp_email(otp_code, student_name))
         
         # Send email
         with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
@@ -99,6 +126,122 @@ If you did not request this code, please ignore this email.
         return False, f"Error: {str(e)}"
 
 
+class SMTPConnectionPool:
+    """
+    Pool of long-lived, authenticated SMTP connections.
+    
+    Connecting, STARTTLS and LOGIN cost several round trips, so connections
+    are kept open and reused across messages. At most `size` connections are
+    open at once; callers block until one is free. Connections older than
+    `max_age` seconds are recycled, and a connection that fails mid-send is
+    discarded rather than returned to the pool.
+    
+    `smtp_class` can be swapped for a stand-in server class in tests.
+    """
+    
+    def __init__(self, host: str, port: int, user: str = None, password: str = None,
+                 size: int = 2, max_age: float = 300, use_tls: bool = True,
+                 timeout: float = 30, smtp_class=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.max_age = max_age
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.smtp_class = smtp_class
+        
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+    
+    @classmethod
+    def from_config(cls, config, **kwargs) -> 'SMTPConnectionPool':
+        """Create a pool from a Flask config mapping (or the Config class)."""
+        get = config.get if hasattr(config, 'get') else lambda key: getattr(config, key, None)
+        options = dict(
+            host=get('SMTP_SERVER'),
+            port=get('SMTP_PORT'),
+            user=get('SMTP_USER'),
+            password=get('SMTP_PASSWORD'),
+            size=get('SMTP_POOL_SIZE') or 2,
+            max_age=get('SMTP_CONNECTION_MAX_AGE') or 300,
+        )
+        options.update(kwargs)
+        return cls(**options)
+    
+    def _connect(self):
+        server = self.smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            self._discard(server)
+            raise
+        self.connections_opened += 1
+        return server, time.monotonic()
+    
+    def _discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+    
+    def _checkout(self):
+        while True:
+            try:
+                server, opened_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - opened_at < self.max_age:
+                return server, opened_at
+            self._discard(server)
+    
+    @contextmanager
+    def connection(self):
+        """Borrow an authenticated connection for the duration of the block."""
+        self._slots.acquire()
+        try:
+            server, opened_at = self._checkout()
+            try:
+                yield server
+            except BaseException:
+                self._discard(server)
+                raise
+            self._idle.put((server, opened_at))
+        finally:
+            self._slots.release()
+    
+    def send_message(self, msg) -> None:
+        """
+        Send a message over a pooled connection.
+        
+        A pooled connection may have been dropped by the server while idle,
+        so a disconnect is retried once on a fresh connection.
+        """
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection() as server:
+                server.send_message(msg)
+    
+    def close(self) -> None:
+        """Close all idle connections."""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(server)
+
+
 def send_test_email(to_email: str) -> tuple[bool, str]:
     """Send a test email to verify SMTP configuration."""
     try:
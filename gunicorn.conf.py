@@ -0,0 +1,90 @@
+"""
+Gunicorn settings for production (Linux).
+
+The app is imported and warmed once in the master (preload_app, wsgi.py)
+and then forked, so workers start in milliseconds and share the loaded code
+and templates copy-on-write. Each worker runs GUNICORN_THREADS request
+threads; its background threads (email queue, OTP sweeper, results feed,
+serial writer) start on first use in that worker.
+
+Startup time and each worker's memory are logged:
+    app preloaded in 630 ms, master rss 57.5 MB
+    worker 1234 ready in 5 ms, rss 48.8 MB (44.5 MB shared)
+
+Usage:
+    pip install -r requirements-prod.txt
+    ./serve.sh                  # or: gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+import gc
+import multiprocessing
+import os
+import time
+
+_started = time.monotonic()
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+# One worker per core by default; with SQLite every worker shares one
+# database file, so more processes mostly add lock contention
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 8)  # each open results stream holds one
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+accesslog = os.environ.get('ACCESS_LOG') or None  # '-' for stdout
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def _memory_mb() -> tuple:
+    """(resident, shared) memory of this process in MB, from /proc (Linux)."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    # Pages still shared with the master (or other workers) count as shared
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return fields.get('Rss', 0) / 1024, shared / 1024
+
+
+def when_ready(server):
+    from app import app
+
+    if server.cfg.workers > 1 and app.config.get('OTP_STORE') == 'memory':
+        server.log.warning('OTP_STORE=memory keeps OTPs per process; logins will fail across %d workers', server.cfg.workers)
+    rss, _ = _memory_mb()
+    server.log.info('app preloaded in %.0f ms, master rss %.1f MB', (time.monotonic() - _started) * 1000, rss)
+    # Keep the preloaded objects out of the collector, so a collection in a
+    # worker does not touch (and un-share) the pages they live on
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import app
+    from models import db
+
+    worker.forked_at = time.monotonic()
+    # Connections opened in the master must not be shared with the children:
+    # drop them from this worker's pools without closing the master's sockets
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    rss, shared = _memory_mb()
+    worker.log.info(
+        'worker %d ready in %.0f ms, rss %.1f MB (%.1f MB shared)',
+        worker.pid, (time.monotonic() - worker.forked_at) * 1000, rss, shared
+    )
+
+
+def worker_exit(server, worker):
+    from email_queue import email_queue
+
+    # Let in-flight deliveries finish; unsent mail stays in the outbox
+    email_queue.stop()
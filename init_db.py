@@ -4,18 +4,189 @@ Run this script to create the database and seed it with sample data.
 
 Usage:
     python init_db.py
+    python init_db.py --students 50000 --elections 300 --turnout 0.6   # staging-scale data
 """
 
+import argparse
+import random
+from itertools import islice
+from sqlalchemy import insert, func
 from app import app
 from models import db, Student, Election, Candidate
+from voting import generate_anonymous_token
+from vote_shards import vote_shards
 
 
-def init_database():
-    """Initialize the database with tables and sample data."""
+def _chunks(rows, size):
+    """Split an iterator of rows into lists of at most `size` rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _by_shard(rows):
+    """Group rows with an election_id by the vote shard they belong to."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(vote_shards.get(row['election_id']), []).append(row)
+    return groups.items()
+
+
+def _max_id(model):
+    return db.session.query(func.max(model.id)).scalar() or 0
+
+
+def _student_ids(after_id, chunk_size):
+    """Yield student ids above `after_id` in chunks, using keyset pagination."""
+    last_id = after_id
+    while True:
+        ids = [r.id for r in db.session.query(Student.id).filter(
+            Student.id > last_id
+        ).order_by(Student.id).limit(chunk_size)]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def seed_synthetic_data(num_students=0, num_elections=0, candidates_per_election=3,
+                        turnout=0.0, chunk_size=5000, seed=None, progress=None):
+    """
+    Add generated students, active elections and ballots on top of the sample data.
+    
+    Rows are generated lazily and written with bulk Core inserts, one commit
+    per chunk of `chunk_size`, so memory stays flat regardless of scale.
+    Each generated student votes in each generated election with probability
+    `turnout`; ballots use the same VoteToken/Vote token scheme as cast_vote()
+    and the candidate tallies are written to match.
+    
+    Students get @rvce.edu.in addresses of the form load<N>@rvce.edu.in.
+    `progress`, if given, is called with the number of ballots written
+    after every chunk.
+    
+    Returns:
+        dict: number of students, elections, candidates and votes created
+    """
+    rng = random.Random(seed)
+    first_student_id = _max_id(Student)
+    first_election_id = _max_id(Election)
+    
+    students = (
+        {
+            'student_id': f'1RV00LD{i:06d}',
+            'email': f'load{i}@rvce.edu.in',
+            'name': f'Load Student {i}',
+            'is_admin': False
+        }
+        for i in range(num_students)
+    )
+    for chunk in _chunks(students, chunk_size):
+        db.session.execute(insert(Student), chunk)
+        db.session.commit()
+    
+    elections = (
+        {
+            'title': f'Synthetic Election {i + 1}',
+            'description': 'Generated election for load testing.',
+            'is_active': True
+        }
+        for i in range(num_elections)
+    )
+    for chunk in _chunks(elections, chunk_size):
+        db.session.execute(insert(Election), chunk)
+    election_ids = [r.id for r in db.session.query(Election.id).filter(
+        Election.id > first_election_id
+    ).order_by(Election.id)]
+    
+    candidates = (
+        {'election_id': election_id, 'name': f'Candidate {election_id}-{j + 1}', 'description': ''}
+        for election_id in election_ids
+        for j in range(candidates_per_election)
+    )
+    for chunk in _chunks(candidates, chunk_size):
+        db.session.execute(insert(Candidate), chunk)
+    db.session.commit()
+    # Create the vote shards (VOTE_SHARDING) before any ballot is written
+    vote_shards.create_all()
+    
+    # Candidate ids and a popularity weight per election - O(candidates) memory
+    ballot_choices = {}
+    for c in db.session.query(Candidate.id, Candidate.election_id).filter(
+        Candidate.election_id.in_(election_ids)
+    ) if election_ids else []:
+        ids, weights = ballot_choices.setdefault(c.election_id, ([], []))
+        ids.append(c.id)
+        weights.append(rng.random() + 0.1)
+    
+    tallies = {}
+    votes_cast = 0
+    
+    def ballots():
+        for student_ids in _student_ids(first_student_id, chunk_size):
+            for student_id in student_ids:
+                for election_id, (ids, weights) in ballot_choices.items():
+                    if rng.random() >= turnout:
+                        continue
+                    candidate_id = rng.choices(ids, weights)[0]
+                    tallies[candidate_id] = tallies.get(candidate_id, 0) + 1
+                    token = generate_anonymous_token()
+                    yield (
+                        {'student_id': student_id, 'election_id': election_id, 'token': token},
+                        {'token': token, 'election_id': election_id, 'candidate_id': candidate_id}
+                    )
+    
+    if turnout > 0 and ballot_choices:
+        for chunk in _chunks(ballots(), chunk_size):
+            # Token and vote rows of a ballot are committed together, as in cast_vote()
+            for shard, tokens in _by_shard(token for token, _ in chunk):
+                shard.execute(insert(shard.tokens), tokens)
+            for shard, votes in _by_shard(vote for _, vote in chunk):
+                shard.execute(insert(shard.votes), votes)
+            db.session.commit()
+            votes_cast += len(chunk)
+            if progress:
+                progress(votes_cast)
+    
+    tally_rows = (
+        {'candidate_id': cid, 'election_id': election_id, 'vote_count': tallies.get(cid, 0)}
+        for election_id, (ids, _) in ballot_choices.items()
+        for cid in ids
+    )
+    for chunk in _chunks(tally_rows, chunk_size):
+        for shard, rows in _by_shard(chunk):
+            shard.execute(insert(shard.tallies), rows)
+    db.session.commit()
+    
+    return {
+        'students': num_students,
+        'elections': len(election_ids),
+        'candidates': len(election_ids) * candidates_per_election,
+        'votes': votes_cast
+    }
+
+
+def init_database(num_students=0, num_elections=0, candidates_per_election=3,
+                  turnout=0.0, chunk_size=5000, seed=None, progress=None):
+    """
+    Initialize the database with tables and sample data.
+    
+    Args:
+        num_students: Extra generated students to add (for load testing)
+        num_elections: Extra generated active elections to add
+        candidates_per_election: Candidates in each generated election
+        turnout: Fraction of generated students voting in each generated election
+        chunk_size: Rows per bulk insert/commit while seeding
+        seed: Random seed for reproducible synthetic data
+        progress: Called with the number of synthetic ballots written so far
+    """
     
     with app.app_context():
         # Drop all tables and recreate (for fresh start with new schema)
         db.drop_all()
+        vote_shards.drop_all()
         db.create_all()
         print("✓ Database tables created")
         
@@ -150,8 +321,20 @@ def init_database():
         
         # Commit all changes
         db.session.commit()
+        vote_shards.create_all()
         print("✓ Sample elections and candidates created")
         
+        if num_students or num_elections:
+            created = seed_synthetic_data(
+                num_students, num_elections, candidates_per_election,
+                turnout=turnout, chunk_size=chunk_size, seed=seed, progress=progress
+            )
+            print(
+                f"✓ Synthetic data created: {created['students']} students, "
+                f"{created['elections']} elections, {created['candidates']} candidates, "
+                f"{created['votes']} votes"
+            )
+        
         print("\n" + "="*60)
         print("DATABASE INITIALIZED SUCCESSFULLY!")
         print("="*60)
@@ -178,4 +361,16 @@ def init_database():
 
 
 if __name__ == '__main__':
-    init_database()
+    parser = argparse.ArgumentParser(description='Create the database and seed it with sample data.')
+    parser.add_argument('--students', type=int, default=0, help='Synthetic students to generate')
+    parser.add_argument('--elections', type=int, default=0, help='Synthetic active elections to generate')
+    parser.add_argument('--candidates', type=int, default=3, help='Candidates per synthetic election')
+    parser.add_argument('--turnout', type=float, default=0.0,
+                        help='Fraction of synthetic students voting in each synthetic election (0-1)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+    args = parser.parse_args()
+    
+    init_database(args.students, args.elections, args.candidates,
+                  turnout=args.turnout, chunk_size=args.chunk_size, seed=args.seed,
+                  progress=lambda ballots: print(f"  ... {ballots} ballots", end='\r', flush=True))
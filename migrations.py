@@ -0,0 +1,150 @@
+"""
+Schema migrations and query plan checks.
+
+upgrade_database() brings an existing voting.db up to the schema declared
+in models.py without touching its data: missing tables are created and
+missing nullable columns and indexes are added to existing tables. The one exception is
+otp_codes, which is dropped and rebuilt when its columns change; pending
+OTPs are lost and students simply request a new one. It is safe to run
+repeatedly.
+
+check_query_plans() runs EXPLAIN QUERY PLAN (SQLite) on the hot queries in
+voting.py and models.py and reports any that fall back to a table scan.
+
+Usage:
+    flask --app app upgrade-db
+    flask --app app check-indexes
+"""
+
+from datetime import datetime
+from sqlalchemy import inspect, select, update, delete, func
+from models import db, Student, OTPCode, Election, Candidate, CandidateTally, VoteToken, Vote, OutboxEmail
+
+
+# Tables whose rows may be thrown away when their schema changes
+EPHEMERAL_TABLES = {'otp_codes'}
+
+
+def upgrade_database() -> list:
+    """
+    Create missing tables, nullable columns and indexes, and rebuild
+    outdated ephemeral tables.
+
+    Returns:
+        list: names of the tables, columns and indexes that were created
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    # Tables holding only short-lived data are rebuilt when their columns
+    # changed instead of being migrated (e.g. otp_codes storing hashes)
+    recreated = []
+    for name in EPHEMERAL_TABLES & existing_tables:
+        table = db.metadata.tables[name]
+        columns = {c['name'] for c in inspector.get_columns(name)}
+        if columns != {c.name for c in table.columns}:
+            table.drop(db.engine)
+            existing_tables.discard(name)
+            recreated.append(name)
+
+    created = [
+        f'{t.name} (dropped and recreated; pending OTPs were discarded)' if t.name in recreated else t.name
+        for t in db.metadata.sorted_tables if t.name not in existing_tables
+    ]
+    db.create_all()
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all() built it together with its indexes
+        # New nullable columns (e.g. elections.closed_at) are added in place
+        existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                created.append(f'{table.name}.{column.name}')
+        existing_indexes = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+                created.append(index.name)
+
+    return created
+
+
+def hot_queries() -> dict:
+    """
+    Statements equivalent to the ones issued on the login, voting and admin
+    paths. Every one of them is expected to be answered from an index.
+    """
+    now = datetime.utcnow()
+    return {
+        'login: student by email': select(Student).where(Student.email == 'student@rvce.edu.in'),
+        'generate_otp: clear unused': delete(OTPCode).where(
+            OTPCode.student_id == 1, OTPCode.is_used == False
+        ),
+        'has_pending_otp': select(OTPCode.id).where(
+            OTPCode.student_id == 1, OTPCode.is_used == False, OTPCode.expires_at > now
+        ),
+        'verify_otp': update(OTPCode).where(
+            OTPCode.student_id == 1, OTPCode.is_used == False,
+            OTPCode.code_hash == '0' * 64, OTPCode.expires_at > now
+        ).values(is_used=True, expires_at=now),
+        'sweep_expired': select(OTPCode.id).where(OTPCode.expires_at <= now).limit(1000),
+        'has_voted': select(VoteToken).where(
+            VoteToken.student_id == 1, VoteToken.election_id == 1
+        ),
+        'get_voted_election_ids': select(VoteToken.election_id).where(VoteToken.student_id == 1),
+        'cast_vote: candidate': select(Candidate).where(Candidate.id == 1),
+        'cast_vote: tally': update(CandidateTally).where(
+            CandidateTally.candidate_id == 1
+        ).values(vote_count=CandidateTally.vote_count + 1),
+        'get_election_results': select(
+            Election.id, Candidate.id, func.coalesce(CandidateTally.vote_count, 0)
+        ).outerjoin(
+            Candidate, Candidate.election_id == Election.id
+        ).outerjoin(
+            CandidateTally, Candidate.id == CandidateTally.candidate_id
+        ).where(Election.id == 1),
+        'delete_election: votes': delete(Vote).where(Vote.election_id == 1),
+        'delete_election: tokens': delete(VoteToken).where(VoteToken.election_id == 1),
+        'delete_election: candidates': delete(Candidate).where(Candidate.election_id == 1),
+        'delete_election: tallies': delete(CandidateTally).where(CandidateTally.election_id == 1),
+        'delete_candidate: votes': delete(Vote).where(Vote.candidate_id == 1),
+        'delete_student: otps': delete(OTPCode).where(OTPCode.student_id == 1),
+        'delete_student: tokens': delete(VoteToken).where(VoteToken.student_id == 1),
+        'email queue: due rows': select(OutboxEmail.id).where(
+            OutboxEmail.status.in_(('pending', 'sending')), OutboxEmail.next_attempt_at <= now
+        ),
+        'email queue: purge finished': select(OutboxEmail.id).where(
+            OutboxEmail.status.in_(('sent', 'failed', 'expired')), OutboxEmail.next_attempt_at < now
+        ).limit(1000),
+    }
+
+
+def check_query_plans() -> list:
+    """
+    EXPLAIN every hot query and flag full table scans.
+
+    Only SQLite is supported; other databases have their own EXPLAIN output.
+
+    Returns:
+        list: dicts with name, plan (list of detail strings) and uses_index
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('Query plan checks are only implemented for SQLite.')
+
+    report = []
+    with db.engine.connect() as conn:
+        for name, statement in hot_queries().items():
+            sql = str(statement.compile(
+                dialect=db.engine.dialect,
+                compile_kwargs={'literal_binds': True}
+            ))
+            plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+            # "SCAN votes" is a table scan; "SEARCH ... USING INDEX" and
+            # "SCAN ... USING COVERING INDEX" are served from an index
+            scans = [d for d in plan if d.startswith('SCAN') and 'USING' not in d]
+            report.append({'name': name, 'plan': plan, 'uses_index': not scans})
+    return report
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime, timedelta
-import secrets
+from flask import current_app
+from datetime import datetime
+import hashlib
+import hmac
+import uuid
 
 db = SQLAlchemy()
 
@@ -30,46 +33,85 @@ class OTPCode(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
-    code = db.Column(db.String(6), nullable=False)
+    code_hash = db.Column(db.String(64), nullable=False)  # see hash_code(); the code itself is never stored
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
     is_used = db.Column(db.Boolean, default=False)
     
+    # The first index covers verify_otp (student_id + is_used + code_hash) and
+    # the per-student lookups in generate_otp/has_pending_otp; the second lets
+    # sweep_expired find dead rows without scanning the table
+    __table_args__ = (
+        db.Index('ix_otp_codes_student_used_hash', 'student_id', 'is_used', 'code_hash'),
+        db.Index('ix_otp_codes_expires_at', 'expires_at'),
+    )
+    
+    @staticmethod
+    def hash_code(student_id, code):
+        """
+        Keyed hash of a student's OTP.
+        
+        A 6-digit code has only a million values, so a plain hash could be
+        reversed by brute force; keying it with OTP_HASH_KEY means the
+        stored hashes alone do not reveal pending codes. The database is not
+        code-free, though: an OTP email waiting in email_outbox carries its
+        code in plain text until it is sent, fails or expires, when
+        email_queue.py blanks the body.
+        """
+        key = current_app.config['OTP_HASH_KEY'].encode()
+        return hmac.new(key, f'{student_id}:{code}'.encode(), hashlib.sha256).hexdigest()
+    
+    # Codes are kept by the configured OTP store (otp_store.py); with the
+    # default SQL store that is this table
+    
+    @staticmethod
+    def store():
+        return current_app.extensions['otp_store']
+    
     @staticmethod
     def generate_otp(student_id, expiry_minutes=5):
-        """Generate a new 6-digit OTP for a student."""
-        # Invalidate any existing unused OTPs for this student
-        OTPCode.query.filter_by(student_id=student_id, is_used=False).delete()
+        """Generate a new 6-digit OTP for a student, replacing any unused one."""
+        return OTPCode.store().generate(student_id, expiry_minutes)
+    
+    @staticmethod
+    def bulk_generate(student_ids, expiry_minutes=5):
+        """
+        Generate OTPs for many students at once.
         
-        code = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
-        otp = OTPCode(
-            student_id=student_id,
-            code=code,
-            expires_at=datetime.utcnow() + timedelta(minutes=expiry_minutes)
-        )
-        db.session.add(otp)
-        db.session.commit()
-        return code
+        Returns:
+            dict: student_id -> 6-digit code
+        """
+        return OTPCode.store().bulk_generate(student_ids, expiry_minutes)
+    
+    @staticmethod
+    def has_pending_otp(student_id):
+        """Check if a student already has an unused, unexpired OTP."""
+        return OTPCode.store().has_pending(student_id)
     
     @staticmethod
     def verify_otp(student_id, code):
-        """Verify an OTP code for a student."""
-        otp = OTPCode.query.filter_by(
-            student_id=student_id,
-            code=code,
-            is_used=False
-        ).first()
-        
-        if not otp:
-            return False, "Invalid OTP code."
+        """
+        Verify and consume an OTP code for a student.
         
-        if datetime.utcnow() > otp.expires_at:
-            return False, "OTP has expired. Please request a new one."
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        return OTPCode.store().verify(student_id, code)
+    
+    @staticmethod
+    def discard_otps(student_id):
+        """Forget a student's codes (e.g. when the student is deleted). Caller commits."""
+        OTPCode.store().discard(student_id)
+    
+    @staticmethod
+    def sweep_expired(batch_size=1000):
+        """
+        Delete expired and used OTPs.
         
-        # Mark as used
-        otp.is_used = True
-        db.session.commit()
-        return True, "OTP verified successfully."
+        Returns:
+            int: number of codes deleted
+        """
+        return OTPCode.store().sweep(batch_size)
 
 
 class Election(db.Model):
@@ -81,6 +123,10 @@ class Election(db.Model):
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_at = db.Column(db.DateTime)  # set when voting is closed; Last-Modified of its results
+    # Names the election's vote shard file (VOTE_SHARDING=files), so a new
+    # election never opens a deleted one's shard, even when it reuses its id
+    shard_key = db.Column(db.String(32), default=lambda: uuid.uuid4().hex)
     
     # Relationships
     candidates = db.relationship('Candidate', backref='election', lazy=True)
@@ -96,7 +142,7 @@ class Candidate(db.Model):
     __tablename__ = 'candidates'
     
     id = db.Column(db.Integer, primary_key=True)
-    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     
@@ -107,6 +153,23 @@ class Candidate(db.Model):
         return f'<Candidate {self.name}>'
 
 
+class CandidateTally(db.Model):
+    """
+    Running vote count per candidate.
+    Incremented in the same transaction that stores the ballot, so results
+    are read from here instead of aggregating the whole votes table.
+    Use voting.reconcile_tallies() to check it against the votes table.
+    """
+    __tablename__ = 'candidate_tallies'
+    
+    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), primary_key=True)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False, index=True)
+    vote_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<CandidateTally {self.candidate_id}: {self.vote_count}>'
+
+
 class VoteToken(db.Model):
     """
     Vote token model - links student to election (for double-vote prevention).
@@ -117,7 +180,7 @@ class VoteToken(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
-    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
+    election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False, index=True)
     token = db.Column(db.String(64), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -142,8 +205,41 @@ class Vote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String(64), nullable=False)
     election_id = db.Column(db.Integer, db.ForeignKey('elections.id'), nullable=False)
-    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), nullable=False)
+    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_votes_election_candidate', 'election_id', 'candidate_id'),
+    )
+    
     def __repr__(self):
         return f'<Vote for candidate {self.candidate_id}>'
+
+
+class OutboxEmail(db.Model):
+    """
+    Persistent outbox for outgoing emails.
+    Rows are written by the request thread and delivered in the background
+    by email_queue.EmailQueue, so queued mail survives a restart.
+    """
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    text_body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, sending, sent, failed, expired
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    # Queue workers poll for due rows by status and next_attempt_at
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status}>'
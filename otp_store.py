@@ -0,0 +1,306 @@
+"""
+OTP Stores
+Where one-time login codes live between generation and verification.
+
+OTPCode.generate_otp(), verify_otp() and friends delegate to the store that
+init_app() registers, chosen by the OTP_STORE setting:
+
+    sql     otp_codes table in the main database (default)
+    memory  bounded in-process dict with expiry and LRU eviction. Keeps the
+            login surge off the database, but codes live in one process:
+            only use it with a single server process.
+    redis   any Redis-compatible server. Shared by all processes and expired
+            by Redis itself (needs the `redis` package, or pass a client).
+
+Every store keeps only OTPCode.hash_code() of a code, never the code itself.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update, delete, select
+from models import db, OTPCode
+
+
+INVALID_OTP = "Invalid OTP code."
+EXPIRED_OTP = "OTP has expired. Please request a new one."
+VERIFIED_OTP = "OTP verified successfully."
+
+
+def new_code() -> str:
+    """Random 6-digit code."""
+    return ''.join([str(secrets.randbelow(10)) for _ in range(6)])
+
+
+class SQLOTPStore:
+    """Codes in the otp_codes table."""
+
+    def generate(self, student_id, expiry_minutes=5):
+        # Invalidate any existing unused OTPs for this student
+        OTPCode.query.filter_by(student_id=student_id, is_used=False).delete()
+
+        code = new_code()
+        otp = OTPCode(
+            student_id=student_id,
+            code_hash=OTPCode.hash_code(student_id, code),
+            expires_at=datetime.utcnow() + timedelta(minutes=expiry_minutes)
+        )
+        db.session.add(otp)
+        db.session.commit()
+        return code
+
+    def bulk_generate(self, student_ids, expiry_minutes=5):
+        # One DELETE and one multi-row INSERT, committed together
+        codes = {student_id: new_code() for student_id in student_ids}
+        if not codes:
+            return codes
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=expiry_minutes)
+        OTPCode.query.filter(
+            OTPCode.student_id.in_(list(codes)),
+            OTPCode.is_used == False
+        ).delete(synchronize_session=False)
+        db.session.execute(insert(OTPCode), [
+            {
+                'student_id': student_id,
+                'code_hash': OTPCode.hash_code(student_id, code),
+                'created_at': now,
+                'expires_at': expires_at
+            }
+            for student_id, code in codes.items()
+        ])
+        db.session.commit()
+        return codes
+
+    def has_pending(self, student_id):
+        return db.session.query(OTPCode.id).filter(
+            OTPCode.student_id == student_id,
+            OTPCode.is_used == False,
+            OTPCode.expires_at > datetime.utcnow()
+        ).first() is not None
+
+    def verify(self, student_id, code):
+        # A single conditional UPDATE consumes the code only if it matches,
+        # is unused and has not expired. Consumed codes are also marked
+        # expired, which lets sweep() remove them.
+        now = datetime.utcnow()
+        code_hash = OTPCode.hash_code(student_id, code)
+        consumed = db.session.execute(
+            update(OTPCode).where(
+                OTPCode.student_id == student_id,
+                OTPCode.is_used == False,
+                OTPCode.code_hash == code_hash,
+                OTPCode.expires_at > now
+            ).values(is_used=True, expires_at=now)
+        ).rowcount
+        db.session.commit()
+
+        if consumed:
+            return True, VERIFIED_OTP
+
+        # Only on failure: tell an expired code apart from a wrong one
+        expired = db.session.query(OTPCode.id).filter(
+            OTPCode.student_id == student_id,
+            OTPCode.is_used == False,
+            OTPCode.code_hash == code_hash
+        ).first()
+        return False, EXPIRED_OTP if expired else INVALID_OTP
+
+    def discard(self, student_id):
+        # Part of the caller's transaction (e.g. deleting the student)
+        OTPCode.query.filter_by(student_id=student_id).delete()
+
+    def sweep(self, batch_size=1000):
+        now = datetime.utcnow()
+        deleted = 0
+        while True:
+            ids = select(OTPCode.id).where(OTPCode.expires_at <= now).limit(batch_size)
+            count = db.session.execute(
+                delete(OTPCode).where(OTPCode.id.in_(ids.scalar_subquery()))
+            ).rowcount
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+class MemoryOTPStore:
+    """
+    Codes in a bounded in-process dict.
+
+    At most `max_entries` students have a pending code; beyond that the
+    least recently issued code is evicted (that student has to resend).
+    Expired codes are dropped when looked up and by sweep().
+    """
+
+    def __init__(self, max_entries=100000, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._codes = OrderedDict()  # student_id -> (code_hash, expires_at)
+        self._lock = threading.Lock()
+
+    def _put(self, student_id, code, expiry_minutes):
+        entry = (OTPCode.hash_code(student_id, code), self.clock() + expiry_minutes * 60)
+        with self._lock:
+            self._codes[student_id] = entry
+            self._codes.move_to_end(student_id)
+            while len(self._codes) > self.max_entries:
+                self._codes.popitem(last=False)
+
+    def generate(self, student_id, expiry_minutes=5):
+        code = new_code()
+        self._put(student_id, code, expiry_minutes)
+        return code
+
+    def bulk_generate(self, student_ids, expiry_minutes=5):
+        codes = {student_id: new_code() for student_id in student_ids}
+        for student_id, code in codes.items():
+            self._put(student_id, code, expiry_minutes)
+        return codes
+
+    def has_pending(self, student_id):
+        entry = self._codes.get(student_id)
+        return entry is not None and entry[1] > self.clock()
+
+    def verify(self, student_id, code):
+        code_hash = OTPCode.hash_code(student_id, code)
+        with self._lock:
+            entry = self._codes.get(student_id)
+            if entry is None or not secrets.compare_digest(entry[0], code_hash):
+                return False, INVALID_OTP
+            del self._codes[student_id]
+        if entry[1] <= self.clock():
+            return False, EXPIRED_OTP
+        return True, VERIFIED_OTP
+
+    def discard(self, student_id):
+        with self._lock:
+            self._codes.pop(student_id, None)
+
+    def sweep(self, batch_size=1000):
+        now = self.clock()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._codes.items() if expires_at <= now]
+            for student_id in expired:
+                del self._codes[student_id]
+        return len(expired)
+
+
+class RedisOTPStore:
+    """
+    Codes in a Redis-compatible server.
+
+    Works with any client offering get/set(ex=)/delete/exists. Each code is
+    stored under a key containing its hash, so a single DELETE both checks
+    and consumes it atomically. A second key per student holds the current
+    hash, for has_pending() and for replacing a code on resend.
+    """
+
+    def __init__(self, client, prefix='otp:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _student_key(self, student_id):
+        return f'{self.prefix}{student_id}'
+
+    def _code_key(self, student_id, code_hash):
+        return f'{self.prefix}{student_id}:{code_hash}'
+
+    def generate(self, student_id, expiry_minutes=5):
+        code = new_code()
+        code_hash = OTPCode.hash_code(student_id, code)
+        previous = self.client.get(self._student_key(student_id))
+        if previous is not None:
+            if isinstance(previous, bytes):
+                previous = previous.decode()
+            self.client.delete(self._code_key(student_id, previous))
+        ttl = int(expiry_minutes * 60)
+        self.client.set(self._code_key(student_id, code_hash), 1, ex=ttl)
+        self.client.set(self._student_key(student_id), code_hash, ex=ttl)
+        return code
+
+    def bulk_generate(self, student_ids, expiry_minutes=5):
+        return {student_id: self.generate(student_id, expiry_minutes) for student_id in student_ids}
+
+    def has_pending(self, student_id):
+        return bool(self.client.exists(self._student_key(student_id)))
+
+    def verify(self, student_id, code):
+        code_hash = OTPCode.hash_code(student_id, code)
+        if self.client.delete(self._code_key(student_id, code_hash)):
+            self.client.delete(self._student_key(student_id))
+            return True, VERIFIED_OTP
+        # Redis has already forgotten expired codes; if the student has no
+        # pending code at all, the one they typed most likely expired
+        if not self.client.exists(self._student_key(student_id)):
+            return False, EXPIRED_OTP
+        return False, INVALID_OTP
+
+    def discard(self, student_id):
+        previous = self.client.get(self._student_key(student_id))
+        if previous is not None:
+            if isinstance(previous, bytes):
+                previous = previous.decode()
+            self.client.delete(self._code_key(student_id, previous))
+        self.client.delete(self._student_key(student_id))
+
+    def sweep(self, batch_size=1000):
+        return 0  # Redis expires keys itself
+
+
+def create_store(config, redis_client=None):
+    """Build the store selected by config['OTP_STORE']."""
+    backend = config.get('OTP_STORE', 'sql')
+    if backend == 'sql':
+        return SQLOTPStore()
+    if backend == 'memory':
+        return MemoryOTPStore(config.get('OTP_STORE_MAX_ENTRIES', 100000))
+    if backend == 'redis':
+        if redis_client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("OTP_STORE=redis needs the redis package (pip install redis).")
+            redis_client = redis.Redis.from_url(config['OTP_REDIS_URL'])
+        return RedisOTPStore(redis_client, config.get('OTP_REDIS_PREFIX', 'otp:'))
+    raise ValueError(f"Unknown OTP_STORE {backend!r} (expected sql, memory or redis).")
+
+
+def instance_hash_key(app) -> str:
+    """
+    The OTP hash key kept in the app's instance folder, generated on first
+    use. Every process of one installation reads the same file; the first
+    one to need it creates it atomically (os.link fails if it exists).
+    """
+    path = os.path.join(app.instance_path, 'otp_hash_key')
+    if not os.path.exists(path):
+        os.makedirs(app.instance_path, exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def init_app(app, redis_client=None):
+    """
+    Create the configured OTP store and register it for OTPCode.
+
+    The hash key comes from OTP_HASH_KEY or SECRET_KEY in the environment,
+    or else from instance_hash_key(). It is never empty: with an empty key
+    the stored hashes of 6-digit codes are trivially reversed.
+    """
+    if not app.config.get('OTP_HASH_KEY'):
+        app.config['OTP_HASH_KEY'] = instance_hash_key(app)
+    app.extensions['otp_store'] = create_store(app.config, redis_client)
@@ -0,0 +1,72 @@
+"""
+OTP Sweeper
+Keeps the otp_codes table small by deleting expired and used codes, and
+the email outbox by deleting finished messages after EMAIL_RETENTION_DAYS.
+
+A background thread runs OTPCode.sweep_expired() and
+email_queue.purge_finished() every OTP_SWEEP_INTERVAL_SECONDS. Like the email queue workers, it starts on first
+use (the login routes call start()) and once per process, so forked
+workers get their own. `flask sweep-otps` runs a single sweep instead.
+"""
+
+import os
+import threading
+from models import db, OTPCode
+from email_queue import email_queue
+
+
+class OTPSweeper:
+    """Periodic background deletion of dead OTP rows."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['otp_sweeper'] = self
+
+    def start(self) -> None:
+        """Start the sweeper thread, unless disabled or already running in this process."""
+        if self._pid == os.getpid() or not self.app.config.get('OTP_SWEEP_INTERVAL_SECONDS'):
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='otp-sweeper', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _run(self) -> None:
+        interval = self.app.config['OTP_SWEEP_INTERVAL_SECONDS']
+        batch_size = self.app.config.get('OTP_SWEEP_BATCH_SIZE', 1000)
+        with self.app.app_context():
+            while not self._stop.wait(interval):
+                try:
+                    deleted = OTPCode.sweep_expired(batch_size)
+                    if deleted:
+                        self.app.logger.info('OTP sweeper deleted %d expired or used codes', deleted)
+                    purged = email_queue.purge_finished(batch_size)
+                    if purged:
+                        self.app.logger.info('OTP sweeper deleted %d finished outbox emails', purged)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception('OTP sweeper error: %s', e)
+                finally:
+                    db.session.remove()
+
+
+otp_sweeper = OTPSweeper()
@@ -0,0 +1,204 @@
+"""
+OTP Pre-warming
+Generates and mails OTPs for a whole cohort ahead of an election opening.
+
+Students are read in id-ordered chunks, each chunk gets its OTPs from a
+single bulk insert (OTPCode.bulk_generate) and the rendered messages are
+streamed through a small number of long-lived SMTP sessions in batches.
+Progress and throughput are tracked on a PrewarmJob.
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from flask import current_app
+from models import db, Student, OTPCode
+from email_service import SMTPConnectionPool, build_message, render_otp_email
+
+
+class PrewarmJob:
+    """Progress of a pre-warm run. Counters are updated from the sender threads."""
+
+    def __init__(self, cohort: str = None):
+        self.cohort = cohort
+        self.status = 'pending'  # pending, running, finished, failed
+        self.total = 0
+        self.generated = 0
+        self.sent = 0
+        self.failed = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, sent: int = 0, failed: int = 0) -> None:
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed
+        done = self.sent + self.failed
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - done
+        return {
+            'cohort': self.cohort,
+            'status': self.status,
+            'total': self.total,
+            'generated': self.generated,
+            'sent': self.sent,
+            'failed': self.failed,
+            'elapsed_seconds': round(elapsed, 2),
+            'messages_per_second': round(rate, 1),
+            'eta_seconds': round(remaining / rate, 1) if rate > 0 and self.status == 'running' else None,
+            'error': self.error
+        }
+
+
+def cohort_query(prefix: str = None):
+    """Non-admin students, optionally restricted to a student_id prefix (e.g. '1RV21')."""
+    query = db.session.query(Student.id, Student.email, Student.name).filter(Student.is_admin == False)
+    if prefix:
+        query = query.filter(Student.student_id.startswith(prefix.upper()))
+    return query
+
+
+def _send_batch(pool: SMTPConnectionPool, batch: list, job: PrewarmJob) -> None:
+    """Send a batch over one SMTP session, reconnecting once if the server drops it."""
+    pending = list(batch)
+    for attempt in range(2):
+        try:
+            with pool.connection() as server:
+                while pending:
+                    try:
+                        server.send_message(pending[0])
+                        job.record(sent=1)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError):
+                        job.record(failed=1)
+                    pending.pop(0)
+            return
+        except (smtplib.SMTPException, OSError):
+            if attempt:
+                break
+    job.record(failed=len(pending))
+
+
+def prewarm_otps(job: PrewarmJob, pool: SMTPConnectionPool = None, sessions: int = 4,
+                 batch_size: int = 200, expiry_minutes: int = 120, progress=None) -> PrewarmJob:
+    """
+    Generate OTPs for the job's cohort and mail them.
+
+    Must run inside an app context. `progress`, if given, is called with
+    job.to_dict() after every generated chunk.
+    """
+    pool = pool or SMTPConnectionPool.from_config(current_app.config, size=sessions)
+    batches = queue.Queue(maxsize=sessions * 2)
+
+    def sender():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            try:
+                _send_batch(pool, batch, job)
+            except Exception:
+                job.record(failed=len(batch))
+
+    def put(item):
+        # The queue is bounded: never wait on it once every sender is gone
+        while any(thread.is_alive() for thread in threads):
+            try:
+                batches.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    job.status = 'running'
+    job.started_at = time.monotonic()
+    job.total = cohort_query(job.cohort).count()
+
+    threads = [threading.Thread(target=sender, daemon=True) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        last_id = 0
+        while True:
+            # Keyset pagination keeps memory flat for any cohort size
+            students = cohort_query(job.cohort).filter(
+                Student.id > last_id
+            ).order_by(Student.id).limit(batch_size).all()
+            if not students:
+                break
+            last_id = students[-1].id
+
+            codes = OTPCode.bulk_generate([s.id for s in students], expiry_minutes)
+            job.generated += len(codes)
+            if not put([
+                build_message(s.email, *render_otp_email(codes[s.id], s.name, expiry_minutes))
+                for s in students
+            ]):
+                raise RuntimeError('All SMTP sender threads have stopped.')
+            if progress:
+                progress(job.to_dict())
+        job.status = 'finished'
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        for _ in threads:
+            put(None)
+        for thread in threads:
+            thread.join()
+        pool.close()
+        job.finished_at = time.monotonic()
+        if progress:
+            progress(job.to_dict())
+
+    return job
+
+
+_current_job = None
+_job_lock = threading.Lock()
+
+
+def start_prewarm(app, cohort: str = None, pool: SMTPConnectionPool = None):
+    """
+    Run a pre-warm job on a background thread.
+
+    Returns:
+        tuple: (job or None, message) - None if a job is already running
+    """
+    global _current_job
+    with _job_lock:
+        if _current_job and _current_job.status in ('pending', 'running'):
+            return None, "A pre-warm run is already in progress."
+        job = PrewarmJob(cohort)
+        _current_job = job
+
+    def run():
+        with app.app_context():
+            prewarm_otps(
+                job,
+                pool=pool,
+                sessions=app.config['OTP_PREWARM_SESSIONS'],
+                batch_size=app.config['OTP_PREWARM_BATCH_SIZE'],
+                expiry_minutes=app.config['OTP_PREWARM_EXPIRY_MINUTES']
+            )
+
+    threading.Thread(target=run, name='otp-prewarm', daemon=True).start()
+    return job, "OTP pre-warm started."
+
+
+def current_job():
+    """The most recent pre-warm job in this process, if any."""
+    return _current_job
@@ -0,0 +1,169 @@
+"""
+SQL profiling.
+
+Opt-in (SQL_PROFILING=1) per-request query instrumentation. Engine events
+time every statement and add it to the profile of the request that issued
+it; a request hook then folds the profile into per-endpoint totals (query
+count, DB time, slowest statements) and writes one structured log line per
+request. Admins read the totals from /admin/stats/sql.
+
+Statements run on the serial writer thread (SQLITE_PRODUCTION) count
+towards the request that handed them over. When profiling is disabled no
+listeners or hooks are registered at all.
+"""
+
+import heapq
+import json
+import threading
+import time
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from models import db
+
+
+# Profile of the request being handled in this context, or None
+_current = ContextVar('sql_profile', default=None)
+
+
+class RequestProfile:
+    """Statements issued while handling one request."""
+
+    __slots__ = ('endpoint', 'started', 'queries', 'db_time', 'slowest')
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []  # min-heap of (seconds, statement)
+
+    def add(self, seconds: float, statement: str, keep: int) -> None:
+        self.queries += 1
+        self.db_time += seconds
+        if len(self.slowest) < keep:
+            heapq.heappush(self.slowest, (seconds, statement))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, statement))
+
+
+class EndpointStats:
+    """Totals for one endpoint across requests."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.slowest = []  # min-heap of (seconds, statement)
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'avg_queries': round(self.queries / self.requests, 2) if self.requests else 0.0,
+            'max_queries': self.max_queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'avg_db_ms': round(self.db_time / self.requests * 1000, 3) if self.requests else 0.0,
+            'slowest': [
+                {'ms': round(seconds * 1000, 3), 'statement': statement}
+                for seconds, statement in sorted(self.slowest, reverse=True)
+            ]
+        }
+
+
+class SQLProfiler:
+    """Per-endpoint SQL statistics for the Flask app."""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.keep_slowest = 5
+        self.slow_query_seconds = 0.1
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.app = app
+        app.extensions['sql_profiler'] = self
+        self.enabled = app.config.get('SQL_PROFILING', False)
+        if not self.enabled:
+            return
+
+        self.keep_slowest = app.config.get('SQL_PROFILING_SLOWEST', 5)
+        self.slow_query_seconds = app.config.get('SQL_SLOW_QUERY_MS', 100) / 1000
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+    # ==================== HOOKS ====================
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('sql_profile_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None:
+            return
+        elapsed = time.perf_counter() - conn.info['sql_profile_start'].pop()
+        # Parameters are left out: they can hold OTP hashes and personal data
+        statement = ' '.join(statement.split())[:300]
+        profile.add(elapsed, statement, self.keep_slowest)
+        if elapsed >= self.slow_query_seconds:
+            self.app.logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, profile.endpoint, statement)
+
+    def _start_request(self) -> None:
+        g.sql_profile_token = _current.set(RequestProfile(request.endpoint or request.path))
+
+    def _finish_request(self, error=None) -> None:
+        token = g.pop('sql_profile_token', None)
+        if token is None:
+            return
+        profile = _current.get()
+        _current.reset(token)
+        self.record(profile.endpoint, profile)
+        self.app.logger.info('sql_profile %s', json.dumps({
+            'endpoint': profile.endpoint,
+            'method': request.method,
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 3),
+            'request_ms': round((time.perf_counter() - profile.started) * 1000, 3),
+            'error': error is not None
+        }))
+
+    # ==================== STATISTICS ====================
+
+    def record(self, endpoint: str, profile: RequestProfile) -> None:
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.queries += profile.queries
+            stats.max_queries = max(stats.max_queries, profile.queries)
+            stats.db_time += profile.db_time
+            for entry in profile.slowest:
+                if len(stats.slowest) < self.keep_slowest:
+                    heapq.heappush(stats.slowest, entry)
+                elif entry[0] > stats.slowest[0][0]:
+                    heapq.heapreplace(stats.slowest, entry)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints = {}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self._endpoints.items()}
+        return {
+            'enabled': self.enabled,
+            # Busiest endpoints by total DB time first
+            'endpoints': dict(sorted(endpoints.items(), key=lambda item: item[1]['db_ms'], reverse=True))
+        }
+
+
+sql_profiler = SQLProfiler()
@@ -0,0 +1,104 @@
+"""
+Public results API.
+
+Read-only JSON results of closed elections for notice boards and the
+student portal, served without login from /api/results. Only closed
+elections are visible: their results cannot change, so responses carry an
+ETag and Last-Modified, may be cached by proxies, and are encoded (and
+gzipped) once per election rather than once per request.
+
+An admin can still delete a closed election or one of its candidates, or
+repair its tallies. Bodies follow the results cache, so every worker stops
+serving the old results within RESULTS_CACHE_CLOSED_TTL_SECONDS, plus
+PUBLIC_RESULTS_MAX_AGE for copies held by clients and proxies.
+
+Formats:
+    full      the get_election_results() dict
+    columnar  parallel arrays: {"election": {...}, "total_votes": n,
+              "candidate_ids": [...], "names": [...], "vote_counts": [...]}
+"""
+
+import gzip
+import json
+import threading
+from collections import namedtuple
+from datetime import datetime
+from models import db, Election
+from results_cache import results_cache, make_etag
+
+
+FORMATS = ('full', 'columnar')
+
+EncodedResult = namedtuple('EncodedResult', ['body', 'gzipped', 'etag', 'last_modified'])
+
+
+def columnar(result: dict) -> dict:
+    """Results as parallel arrays of candidate ids, names and counts."""
+    candidates = result['candidates']
+    return {
+        'election': result['election'],
+        'total_votes': result['total_votes'],
+        'candidate_ids': [c['id'] for c in candidates],
+        'names': [c['name'] for c in candidates],
+        'vote_counts': [c['vote_count'] for c in candidates]
+    }
+
+
+def last_modified(election: dict) -> datetime:
+    """When an election's results last changed: the moment voting closed."""
+    return datetime.fromisoformat(election['closed_at']) if election.get('closed_at') else None
+
+
+def closed_elections_page(after: int = 0, limit: int = 50) -> dict:
+    """Keyset-paginated index of closed elections, with an ETag for the page."""
+    rows = db.session.query(Election.id, Election.title, Election.closed_at).filter(
+        Election.is_active == False,
+        Election.id > after
+    ).order_by(Election.id).limit(limit + 1).all()
+    items = [
+        {'id': r.id, 'title': r.title, 'closed_at': r.closed_at.isoformat() if r.closed_at else None}
+        for r in rows[:limit]
+    ]
+    next_after = items[-1]['id'] if len(rows) > limit else None
+    return {'items': items, 'next_after': next_after, 'etag': make_etag(items, next_after)}
+
+
+class EncodedResults:
+    """Encoded response bodies per election and format, tied to the results cache ETag."""
+
+    def __init__(self):
+        self._bodies = {}  # (election_id, format) -> EncodedResult
+        self._lock = threading.Lock()
+
+    def get(self, election_id: int, fmt: str = 'full') -> EncodedResult:
+        """
+        Encoded results of a closed election, or None if the election does
+        not exist or is still open. Needs an app context.
+        """
+        entry = results_cache.get(election_id)
+        if entry is None or entry.result['election']['is_active']:
+            # Deleted or reopened: don't keep serving (or holding) old bodies
+            with self._lock:
+                for key in [k for k in self._bodies if k[0] == election_id]:
+                    del self._bodies[key]
+            return None
+
+        key = (election_id, fmt)
+        encoded = self._bodies.get(key)
+        if encoded is not None and encoded.etag == f'{entry.etag}-{fmt}':
+            return encoded
+
+        data = columnar(entry.result) if fmt == 'columnar' else entry.result
+        body = json.dumps(data, separators=(',', ':')).encode()
+        encoded = EncodedResult(
+            body=body,
+            gzipped=gzip.compress(body),
+            etag=f'{entry.etag}-{fmt}',
+            last_modified=last_modified(entry.result['election'])
+        )
+        with self._lock:
+            self._bodies[key] = encoded
+        return encoded
+
+
+encoded_results = EncodedResults()
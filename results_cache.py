@@ -0,0 +1,111 @@
+"""
+Results cache.
+
+Keeps each election's results (the get_election_results() dict) in memory
+together with an ETag, so repeat dashboard and API reads skip the
+aggregation query and clients holding the same ETag get a 304.
+
+- Closed elections cannot receive votes, so their results are kept until
+  the election catalog changes in this process (an admin reopens, edits or
+  deletes one), or for at most RESULTS_CACHE_CLOSED_TTL_SECONDS.
+- Active elections are recomputed after RESULTS_CACHE_TTL_SECONDS.
+
+An entry is also dropped when its election's active state no longer matches
+the catalog, which is how opening and closing by other worker processes
+arrives (within CATALOG_TTL_SECONDS). Deleted elections and candidates, and
+tallies repaired by `flask reconcile-tallies --fix`, change nothing in this
+process's catalog; the closed TTL is what bounds how long other workers
+serve them. A recomputed entry whose results did not change keeps its ETag.
+
+Cached dicts are shared between requests and must not be modified.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from catalog import election_catalog
+from voting import get_all_election_results
+
+
+CachedResult = namedtuple('CachedResult', ['result', 'etag', 'cached_at', 'catalog_version'])
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value for some JSON-serialisable data."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()
+
+
+class ResultsCache:
+    """Per-election results cache, versioned by the election catalog."""
+
+    def __init__(self, ttl: float = 5, closed_ttl: float = 60):
+        self.ttl = ttl
+        self.closed_ttl = closed_ttl
+        self._entries = {}  # election_id -> CachedResult
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('RESULTS_CACHE_TTL_SECONDS', self.ttl)
+        self.closed_ttl = app.config.get('RESULTS_CACHE_CLOSED_TTL_SECONDS', self.closed_ttl)
+        app.extensions['results_cache'] = self
+
+    def _is_fresh(self, election_id: int, entry: CachedResult, catalog, now: float) -> bool:
+        if entry.catalog_version != catalog.version:
+            return False
+        is_active = catalog.get(election_id) is not None
+        if entry.result['election']['is_active'] != is_active:
+            return False
+        return now - entry.cached_at < (self.ttl if is_active else self.closed_ttl)
+
+    def get_many(self, election_ids: list) -> list:
+        """
+        Cached results for these elections, in the given order. Elections
+        that don't exist are left out. Needs an app context.
+
+        Returns:
+            list: CachedResult entries
+        """
+        catalog = election_catalog.get()
+        now = time.monotonic()
+        entries = {}
+        missing = []
+        for election_id in election_ids:
+            entry = self._entries.get(election_id)
+            if entry is not None and self._is_fresh(election_id, entry, catalog, now):
+                entries[election_id] = entry
+            else:
+                missing.append(election_id)
+
+        if missing:
+            # All misses in one aggregation query
+            fresh = {
+                result['election']['id']: CachedResult(result, make_etag(result), now, catalog.version)
+                for result in get_all_election_results(missing)
+            }
+            with self._lock:
+                self._entries.update(fresh)
+                for election_id in missing:
+                    if election_id not in fresh:
+                        self._entries.pop(election_id, None)
+            entries.update(fresh)
+
+        self.hits += len(election_ids) - len(missing)
+        self.misses += len(missing)
+        return [entries[election_id] for election_id in election_ids if election_id in entries]
+
+    def get(self, election_id: int) -> CachedResult:
+        """Cached results for one election, or None if it doesn't exist."""
+        entries = self.get_many([election_id])
+        return entries[0] if entries else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+
+results_cache = ResultsCache()
@@ -0,0 +1,201 @@
+"""
+Live results feed.
+
+Fans election results out to admin dashboards over Server-Sent Events. One
+background thread per process watches the tallies of the active elections
+and publishes changes to every subscriber. Ten admins watching the count
+therefore cost one small tally read per update instead of ten full results
+queries per refresh.
+
+The vote routes call results_feed.notify() after a ballot commits, so
+changes made in this process show up at once. Votes committed in other
+worker processes are picked up on the next poll (RESULTS_STREAM_POLL_SECONDS).
+
+Events sent to each subscriber:
+    snapshot  full results, same shape as get_all_election_results(). Sent
+              on connect and again when elections or candidates change.
+    tally     {"deltas": [{election_id, candidate_id, delta, vote_count}]}.
+              vote_count is the new absolute count, so clients can apply it
+              as-is.
+    reset     the subscriber fell too far behind and should reconnect
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from models import db
+from catalog import election_catalog
+from voting import get_all_election_results, get_tallies
+
+
+class Subscription:
+    """One connected dashboard's event queue."""
+
+    def __init__(self, max_events: int):
+        self.events = queue.Queue(max_events)
+        self.has_snapshot = False
+        self.closed = False
+
+    def send(self, event: str, data) -> bool:
+        """Queue an event. Returns False, and closes the subscription, if the queue is full."""
+        try:
+            self.events.put_nowait((event, data))
+            return True
+        except queue.Full:
+            # Too far behind to catch up with deltas - make the client start over
+            self.closed = True
+            while not self.events.empty():
+                self.events.get_nowait()
+            self.events.put_nowait(('reset', {}))
+            return False
+
+    def stream(self, heartbeat_seconds: float):
+        """Yield Server-Sent Events text until the subscription is closed."""
+        while True:
+            try:
+                event, data = self.events.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event == 'reset':
+                return
+
+
+class ResultsFeed:
+    """Shared, in-process publisher of tally changes."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._subscribers = set()
+        self._tallies = None  # candidate_id -> (election_id, vote_count) last published
+        self._catalog_version = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the feed to a Flask app. The publisher thread starts with the first subscriber."""
+        self.app = app
+        app.extensions['results_feed'] = self
+
+    def notify(self) -> None:
+        """Tell the publisher that votes were committed. Cheap when nobody is watching."""
+        if self._subscribers:
+            self._wakeup.set()
+
+    def subscribe(self) -> Subscription:
+        """Register a dashboard. Its first event is a full snapshot."""
+        subscription = Subscription(self.app.config.get('RESULTS_STREAM_MAX_QUEUED', 100))
+        with self._lock:
+            self._subscribers.add(subscription)
+            self._start()
+        self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    # ==================== PUBLISHER ====================
+
+    def _start(self) -> None:
+        """Start the publisher thread if this process has none. Caller holds the lock."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._tallies = None
+        self._thread = threading.Thread(target=self._run, name='results-feed', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def _run(self) -> None:
+        poll_seconds = self.app.config.get('RESULTS_STREAM_POLL_SECONDS', 2)
+        coalesce_seconds = self.app.config.get('RESULTS_STREAM_COALESCE_SECONDS', 0.25)
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        # Nobody is watching: stop until the next subscriber
+                        self._thread = None
+                        self._pid = None
+                        return
+                    subscribers = list(self._subscribers)
+
+                try:
+                    self.publish(subscribers)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception('Results feed error: %s', e)
+                finally:
+                    db.session.remove()
+
+                self._wakeup.wait(poll_seconds)
+                self._wakeup.clear()
+                # Let a burst of ballots land before the next read
+                time.sleep(coalesce_seconds)
+
+    def publish(self, subscribers: list) -> None:
+        """Read the tallies once and send each subscriber a snapshot or the deltas. Needs an app context."""
+        # Only active elections take ballots; closed ones keep their counts
+        catalog = election_catalog.get()
+        active_ids = {election.id for election in catalog.elections}
+        rows = get_tallies(sorted(active_ids))
+
+        # Candidates without a tally row have no votes yet. A tally for a
+        # candidate we don't know, or a counted one disappearing, means the
+        # candidate list changed in another process.
+        structure_changed = (
+            self._tallies is None
+            or catalog.version != self._catalog_version
+            or any(candidate_id not in self._tallies for candidate_id in rows)
+            or any(candidate_id not in rows and vote_count and election_id in active_ids
+                   for candidate_id, (election_id, vote_count) in self._tallies.items())
+        )
+        new_subscribers = [s for s in subscribers if not s.has_snapshot]
+
+        snapshot = None
+        if structure_changed or new_subscribers:
+            # Full results once, shared by everyone who needs them. Deltas
+            # continue from the counts this snapshot shows.
+            self._catalog_version = catalog.version
+            snapshot = get_all_election_results()
+            tallies = {
+                c['id']: (entry['election']['id'], c['vote_count'])
+                for entry in snapshot for c in entry['candidates']
+            }
+        else:
+            tallies = {
+                candidate_id: rows.get(candidate_id, (election_id, 0)) if election_id in active_ids
+                else (election_id, vote_count)
+                for candidate_id, (election_id, vote_count) in self._tallies.items()
+            }
+
+        deltas = []
+        if not structure_changed:
+            deltas = [
+                {
+                    'election_id': election_id,
+                    'candidate_id': candidate_id,
+                    'delta': vote_count - self._tallies[candidate_id][1],
+                    'vote_count': vote_count
+                }
+                for candidate_id, (election_id, vote_count) in tallies.items()
+                if vote_count != self._tallies[candidate_id][1]
+            ]
+        self._tallies = tallies
+
+        for subscription in subscribers:
+            if subscription.closed:
+                self.unsubscribe(subscription)
+            elif structure_changed or not subscription.has_snapshot:
+                subscription.has_snapshot = subscription.send('snapshot', snapshot)
+            elif deltas:
+                subscription.send('tally', {'deltas': deltas})
+
+
+results_feed = ResultsFeed()
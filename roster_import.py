@@ -0,0 +1,166 @@
+"""
+Bulk student roster import.
+
+Streams a CSV with student_id, email and name columns, validates each row,
+checks duplicates against the database with one set-based query per chunk
+and inserts the valid rows of each chunk in a single batch. Only one chunk
+is held in memory at a time. Rows that are skipped are collected in the
+report with their line number and reason.
+"""
+
+import csv
+from itertools import islice
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, Student
+
+
+REQUIRED_COLUMNS = ('student_id', 'email', 'name')
+
+NOT_UTF8 = 'file is not UTF-8 text (save it as "CSV UTF-8")'
+
+
+class ImportReport:
+    """Outcome of a roster import."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.imported = 0
+        self.errors = []  # (line number, student_id, reason)
+
+    def error(self, line: int, student_id: str, reason: str) -> None:
+        self.errors.append((line, student_id, reason))
+
+    def to_dict(self) -> dict:
+        return {
+            'rows_read': self.rows_read,
+            'imported': self.imported,
+            'skipped': len(self.errors),
+            'errors': [
+                {'line': line, 'student_id': student_id, 'reason': reason}
+                for line, student_id, reason in self.errors
+            ]
+        }
+
+
+def _validate(row: dict) -> str:
+    """Return the reason a row is invalid, or None."""
+    if not row['student_id'] or not row['email'] or not row['name']:
+        return 'student_id, email and name are required'
+    if len(row['student_id']) > 20:
+        return 'student_id is longer than 20 characters'
+    if len(row['email']) > 120 or '@' not in row['email']:
+        return 'invalid email address'
+    if len(row['name']) > 100:
+        return 'name is longer than 100 characters'
+    return None
+
+
+def _import_chunk(chunk: list, report: ImportReport) -> None:
+    """Validate a chunk of (line, row) pairs against each other and the database, then insert it."""
+    valid = []
+    seen_ids, seen_emails = set(), set()
+    for line, row in chunk:
+        reason = _validate(row)
+        if not reason and row['student_id'] in seen_ids:
+            reason = f"duplicate student_id {row['student_id']} in file"
+        if not reason and row['email'] in seen_emails:
+            reason = f"duplicate email {row['email']} in file"
+        if reason:
+            report.error(line, row['student_id'], reason)
+            continue
+        seen_ids.add(row['student_id'])
+        seen_emails.add(row['email'])
+        valid.append((line, row))
+
+    if not valid:
+        return
+
+    # Earlier chunks are already committed, so these also catch duplicates across chunks
+    existing_ids = {r.student_id for r in db.session.query(Student.student_id).filter(
+        Student.student_id.in_(seen_ids)
+    )}
+    existing_emails = {r.email for r in db.session.query(Student.email).filter(
+        Student.email.in_(seen_emails)
+    )}
+
+    rows = []
+    for line, row in valid:
+        if row['student_id'] in existing_ids:
+            report.error(line, row['student_id'], f"student_id {row['student_id']} already exists")
+        elif row['email'] in existing_emails:
+            report.error(line, row['student_id'], f"email {row['email']} already registered")
+        else:
+            rows.append((line, row))
+
+    if not rows:
+        return
+
+    try:
+        db.session.execute(insert(Student), [{**row, 'is_admin': False} for _, row in rows])
+        db.session.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        # Someone registered one of these students concurrently - fall back to row by row
+        db.session.rollback()
+        for line, row in rows:
+            try:
+                db.session.execute(insert(Student), [{**row, 'is_admin': False}])
+                db.session.commit()
+                report.imported += 1
+            except IntegrityError:
+                db.session.rollback()
+                report.error(line, row['student_id'], 'student_id or email already exists')
+
+
+def import_roster(stream, chunk_size: int = 1000) -> ImportReport:
+    """
+    Import students from a CSV text stream.
+
+    Args:
+        stream: Text file object with a header row containing student_id,
+                email and name (other columns are ignored)
+        chunk_size: Rows validated and inserted per batch
+
+    Returns:
+        ImportReport
+    """
+    report = ImportReport()
+    reader = csv.DictReader(stream)
+    try:
+        fieldnames = reader.fieldnames
+    except UnicodeDecodeError:
+        report.error(1, None, NOT_UTF8)
+        return report
+    if fieldnames is None:
+        report.error(1, None, 'file is empty')
+        return report
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [col for col in REQUIRED_COLUMNS if col not in reader.fieldnames]
+    if missing:
+        report.error(1, None, f"missing column(s): {', '.join(missing)}")
+        return report
+
+    def parsed_rows():
+        try:
+            for record in reader:
+                report.rows_read += 1
+                yield reader.line_num, {
+                    'student_id': (record['student_id'] or '').strip(),
+                    'email': (record['email'] or '').strip().lower(),
+                    'name': (record['name'] or '').strip()
+                }
+        except UnicodeDecodeError:
+            # Text is decoded in blocks, so the bad byte is at or after this line
+            report.error(reader.line_num + 1, None, f'{NOT_UTF8}; the rest of the file was skipped')
+
+    rows = parsed_rows()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(chunk, report)
+
+    report.errors.sort(key=lambda error: error[0])
+    return report
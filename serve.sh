@@ -0,0 +1,4 @@
+#!/bin/sh
+# Production server: gunicorn with preloaded, forked workers (see gunicorn.conf.py)
+cd "$(dirname "$0")"
+exec gunicorn -c gunicorn.conf.py wsgi:application "$@"
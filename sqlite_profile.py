@@ -0,0 +1,161 @@
+"""
+SQLite production profile.
+
+Stock SQLite settings serialize readers behind writers and surface lock
+contention as "database is locked" errors. With SQLITE_PRODUCTION enabled:
+
+- every new connection gets the pragmas in Config.SQLITE_PRAGMAS (WAL
+  journal, synchronous=NORMAL, busy_timeout, cache and mmap sizes), so
+  results reads never block ballot commits;
+- ballot and OTP writes are funnelled through a single writer thread
+  (serial_writer.run), so writers in this process queue up instead of
+  racing for the database lock. Writes to other database files (vote shard
+  files, see vote_shards.py) get writer threads of their own
+  (serial_writer.run_in_lane), and a write spanning several of them holds
+  all of their lanes (serial_writer.run_in_lanes).
+
+With the profile off (or on another database) serial_writer.run() simply
+calls the function on the current thread.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from models import db
+
+
+def _pragma_listener(pragmas: dict):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def use_pragmas(engine, pragmas: dict) -> None:
+    """Apply `pragmas` to every new connection of an SQLite engine."""
+    event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+
+def sqlite_pragmas(engine) -> dict:
+    """Current values of the tuned pragmas on a fresh connection (for diagnostics)."""
+    names = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+
+
+class SerialWriter:
+    """
+    Runs write operations one at a time on a dedicated thread with its own
+    app context. Each lane has its own thread; lane 0 is the main database.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._executors = {}  # lane -> single-thread executor
+        self._pid = None
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()  # orders multi-lane work; see run_in_lanes
+
+    def init_app(self, app, enabled: bool) -> None:
+        self.app = app
+        self.enabled = enabled
+        app.extensions['serial_writer'] = self
+
+    def _get_executor(self, lane: int) -> ThreadPoolExecutor:
+        # A forked worker inherits the executor objects but not their threads
+        executor = self._executors.get(lane) if self._pid == os.getpid() else None
+        if executor is None:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executors = {}
+                    self._pid = os.getpid()
+                executor = self._executors.get(lane)
+                if executor is None:
+                    executor = self._executors[lane] = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix=f'db-writer-{lane}'
+                    )
+        return executor
+
+    def _call(self, fn, args, kwargs):
+        with self.app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                db.session.rollback()
+                raise
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread and return its result."""
+        return self.run_in_lane(0, fn, *args, **kwargs)
+
+    def run_in_lane(self, lane: int, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread of `lane` and return its result."""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        # Run in a copy of the caller's context so per-request instrumentation
+        # (profiling.py) follows the work onto the writer thread
+        context = contextvars.copy_context()
+        return self._get_executor(lane).submit(context.run, self._call, fn, args, kwargs).result()
+
+    def run_in_lanes(self, lanes, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the writer thread of the lowest of `lanes`
+        while the threads of the others wait, so nothing else writes to any
+        of them meanwhile, and return its result.
+
+        Every multi-lane call queues on all of its lanes under one lock, so
+        two of them meet in the same order on every lane they share and
+        cannot wait on each other.
+        """
+        lanes = sorted(set(lanes))
+        if not self.enabled or len(lanes) == 1:
+            return self.run_in_lane(lanes[0], fn, *args, **kwargs)
+        context = contextvars.copy_context()
+        holding = [threading.Event() for _ in lanes[1:]]
+        done = threading.Event()
+        with self._queue_lock:
+            for lane, held in zip(lanes[1:], holding):
+                self._get_executor(lane).submit(_hold, held, done)
+            future = self._get_executor(lanes[0]).submit(
+                context.run, self._call_holding, holding, done, fn, args, kwargs
+            )
+        return future.result()
+
+    def _call_holding(self, holding, done, fn, args, kwargs):
+        try:
+            for held in holding:
+                held.wait()
+            return self._call(fn, args, kwargs)
+        finally:
+            done.set()
+
+
+def _hold(held: threading.Event, done: threading.Event) -> None:
+    # Keeps a lane's writer thread busy until a multi-lane call finishes
+    held.set()
+    done.wait()
+
+
+serial_writer = SerialWriter()
+
+
+def init_app(app) -> None:
+    """Apply the SQLite production profile if SQLITE_PRODUCTION is set."""
+    enabled = (
+        app.config.get('SQLITE_PRODUCTION', False)
+        and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    )
+    serial_writer.init_app(app, enabled)
+    if not enabled:
+        return
+
+    with app.app_context():
+        engine = db.engine
+    use_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+    # Connections opened before the listener was registered lack the pragmas
+    engine.dispose()
@@ -0,0 +1,75 @@
+"""
+In-process cache for the logged-in user.
+
+Flask-Login calls the user loader on every authenticated request. Instead of
+loading the Student row each time, a compact read-only snapshot of the
+columns templates and routes read (id, student_id, email, name, is_admin)
+is kept for a short TTL. Admin routes that delete a student or change the
+admin flag invalidate the entry; other worker processes pick the change up
+when their entry expires. admin_required (auth.py) does not trust the cached
+is_admin and checks it against the database.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from flask_login import UserMixin
+
+
+class UserSnapshot(UserMixin, namedtuple('UserSnapshot', ['id', 'student_id', 'email', 'name', 'is_admin'])):
+    """Immutable stand-in for Student, used as current_user."""
+    __slots__ = ()
+
+    @classmethod
+    def from_student(cls, student) -> 'UserSnapshot':
+        return cls(student.id, student.student_id, student.email, student.name, bool(student.is_admin))
+
+
+class UserCache:
+    """TTL cache of UserSnapshot keyed by student id."""
+
+    def __init__(self, ttl: float = 30, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Read USER_CACHE_TTL_SECONDS / USER_CACHE_MAX_ENTRIES from the app config."""
+        self.ttl = app.config.get('USER_CACHE_TTL_SECONDS', self.ttl)
+        self.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id: int, loader):
+        """
+        Return the cached snapshot, calling `loader(user_id)` on a miss.
+
+        `loader` returns a UserSnapshot or None; None is not cached.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and entry[1] > now:
+            return entry[0]
+
+        snapshot = loader(user_id)
+        if snapshot is None:
+            self.invalidate(user_id)
+            return None
+
+        with self._lock:
+            if user_id not in self._entries and len(self._entries) >= self.max_entries:
+                # Evict the oldest insertion to keep memory bounded
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (snapshot, now + self.ttl)
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
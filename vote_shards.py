@@ -0,0 +1,344 @@
+"""
+Vote shards.
+
+Where ballots are stored, per election. Every election's vote tokens, votes
+and candidate tallies normally share the vote_tokens, votes and
+candidate_tallies tables. VOTE_SHARDING partitions them by Election.id:
+
+    ''      shared tables (default)
+    tables  three tables per election in the main database
+            (vote_tokens_e<id>, votes_e<id>, candidate_tallies_e<id>)
+    files   SQLite only: one database file per election in VOTE_SHARD_DIR
+            (election_<id>-<Election.shard_key>.db). Each election has its
+            own write lock, so ballots for concurrent elections commit in
+            parallel (on separate serial writer lanes, see lane()).
+
+With either sharded mode, deleting an election drops its shard instead of
+deleting its rows. Students, elections and candidates stay in the main
+database. Choose the mode before voting starts: existing ballots are not
+moved between layouts.
+
+A shard file's name is never reused: SQLite may give a new election the id
+of a deleted one, but not its shard_key. A worker still holding a deleted
+file finds its name gone on the next get() and looks the election up again,
+and _authorise() in voting.py turns away a ballot written to a shard whose
+key no longer matches the database.
+
+The voting code goes through get() and group() in every mode; with sharding
+off they return the shared tables. They only open existing shards: a
+worker whose catalog still lists a deleted election must not bring its
+shard back. Shards are created by create(), from add_election, upgrade-db
+and init_db.py.
+"""
+
+import glob
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, String, Table, UniqueConstraint, create_engine, inspect
+)
+from sqlalchemy.engine import make_url
+from models import db, Election, VoteToken, Vote, CandidateTally
+from sqlite_profile import use_pragmas
+
+
+MODES = ('', 'tables', 'files')
+
+_SHARD_TABLE = re.compile(r'^(vote_tokens|votes|candidate_tallies)_e\d+$')
+
+
+def ballot_tables(metadata: MetaData, suffix: str = '') -> tuple:
+    """
+    vote_tokens, votes and candidate_tallies as defined in models.py, with
+    `suffix` added to their names. There are no foreign keys: a shard file
+    has no students or candidates to point at.
+    """
+    tokens = Table(
+        f'vote_tokens{suffix}', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('student_id', Integer, nullable=False),
+        Column('election_id', Integer, nullable=False),
+        Column('token', String(64), unique=True, nullable=False),
+        Column('created_at', DateTime, default=datetime.utcnow),
+        UniqueConstraint('student_id', 'election_id', name=f'unique_student_election{suffix}')
+    )
+    votes = Table(
+        f'votes{suffix}', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('token', String(64), nullable=False),
+        Column('election_id', Integer, nullable=False),
+        Column('candidate_id', Integer, nullable=False),
+        Column('created_at', DateTime, default=datetime.utcnow),
+        Index(f'ix_votes{suffix}_candidate_id', 'candidate_id')
+    )
+    tallies = Table(
+        f'candidate_tallies{suffix}', metadata,
+        Column('candidate_id', Integer, primary_key=True, autoincrement=False),
+        Column('election_id', Integer, nullable=False),
+        Column('vote_count', Integer, default=0, nullable=False)
+    )
+    return tokens, votes, tallies
+
+
+class VoteShard:
+    """The ballot tables of one election (or the shared ones) and where they live."""
+
+    def __init__(self, tokens: Table, votes: Table, tallies: Table, engine=None, path: str = None, key: str = None):
+        self.tokens = tokens
+        self.votes = votes
+        self.tallies = tallies
+        self.engine = engine
+        self.path = path
+        self.key = key
+        self._bind_arguments = {'bind': engine} if engine is not None else None
+
+    def execute(self, statement, params=None):
+        """Run a statement on this shard, in the current session transaction."""
+        return db.session.execute(statement, params, bind_arguments=self._bind_arguments)
+
+    def is_current(self) -> bool:
+        # False once another process deleted the file; its name is never reused
+        return self.path is None or os.path.exists(self.path)
+
+    def matches(self, shard_key: str) -> bool:
+        """Whether this is the shard of the election with this Election.shard_key."""
+        return self.path is None or self.key == shard_key
+
+    def close(self) -> None:
+        if self.engine is not None:
+            self.engine.dispose()
+
+
+class VoteShards:
+    """Routes each election's ballots to its shard."""
+
+    def __init__(self):
+        self.app = None
+        self.mode = ''
+        self.directory = None
+        self.writers = 4
+        self._pragmas = None
+        self._shared = VoteShard(VoteToken.__table__, Vote.__table__, CandidateTally.__table__)
+        self._shards = {}  # election_id -> VoteShard
+        self._metadata = MetaData()  # tables mode
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        mode = app.config.get('VOTE_SHARDING') or ''
+        if mode not in MODES:
+            raise ValueError(f"Unknown VOTE_SHARDING {mode!r} (expected '', 'tables' or 'files').")
+        if mode == 'files':
+            uri = app.config['SQLALCHEMY_DATABASE_URI']
+            database = make_url(uri).database
+            if not uri.startswith('sqlite') or not database or database == ':memory:':
+                raise ValueError("VOTE_SHARDING=files needs a file-based SQLite DATABASE_URL.")
+            self.directory = app.config.get('VOTE_SHARD_DIR') or os.path.splitext(database)[0] + '-shards'
+            if app.config.get('SQLITE_PRODUCTION'):
+                self._pragmas = app.config['SQLITE_PRAGMAS']
+        self.app = app
+        self.mode = mode
+        self.writers = app.config.get('VOTE_SHARD_WRITERS', self.writers)
+        app.extensions['vote_shards'] = self
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    def get(self, election_id: int) -> VoteShard:
+        """
+        The shard holding an election's ballots, or None if it has none
+        (the election was deleted). Needs an app context.
+        """
+        if not self.mode:
+            return self._shared
+        shard = self._shards.get(election_id)
+        if shard is not None and shard.is_current():
+            return shard
+        with self._lock:
+            shard = self._shards.get(election_id)
+            if shard is None or not shard.is_current():
+                if shard is not None:
+                    shard.close()
+                shard = self._open(election_id, self._key(election_id))
+                if shard is None:
+                    self._shards.pop(election_id, None)
+                else:
+                    self._shards[election_id] = shard
+        return shard
+
+    def create(self, election) -> VoteShard:
+        """
+        Create the shard of an election (an Election, or a row with id and
+        shard_key) unless it exists, and return it. Needs an app context.
+
+        In tables mode the shard is created on a separate connection, so on
+        SQLite create it before writing in the current session transaction.
+        """
+        if not self.mode:
+            return self._shared
+        with self._lock:
+            shard = self._shards.get(election.id)
+            if shard is None or not shard.is_current():
+                if shard is not None:
+                    shard.close()
+                shard = self._shards[election.id] = self._open(election.id, election.shard_key, create=True)
+        return shard
+
+    def group(self, election_ids: list = None) -> list:
+        """
+        Shards covering these elections (None: all of them), as a list of
+        (shard, election_ids). With sharding off this is one entry for the
+        shared tables, so callers still filter on election_id. Elections
+        without a shard are left out.
+        """
+        if not self.mode:
+            return [(self._shared, election_ids)]
+        if election_ids is None:
+            election_ids = [r.id for r in db.session.query(Election.id).order_by(Election.id)]
+        groups = []
+        for election_id in election_ids:
+            shard = self.get(election_id)
+            if shard is not None:
+                groups.append((shard, [election_id]))
+        return groups
+
+    def lane(self, election_id: int) -> int:
+        """
+        Serial writer lane for this election's ballots (lane 0 is the main
+        database). Ballots spanning several elections take all their lanes.
+        """
+        return 1 + election_id % self.writers if self.mode == 'files' else 0
+
+    def lanes(self) -> dict:
+        """
+        Every election grouped by writer lane: {lane: election_ids}. Unless
+        shards are files this is {0: None}, all elections on the main lane.
+        """
+        if self.mode != 'files':
+            return {0: None}
+        lanes = {}
+        for r in db.session.query(Election.id).order_by(Election.id):
+            lanes.setdefault(self.lane(r.id), []).append(r.id)
+        return lanes
+
+    def _key(self, election_id: int) -> str:
+        if self.mode != 'files':
+            return None
+        return db.session.query(Election.shard_key).filter(Election.id == election_id).scalar()
+
+    def _path(self, election_id: int, key: str) -> str:
+        return os.path.join(self.directory, f'election_{election_id}-{key}.db')
+
+    def _files(self, election_id: int) -> list:
+        # Any generation of the election's shard, with its -wal and -shm files
+        return glob.glob(os.path.join(self.directory, f'election_{election_id}[.-]*'))
+
+    def _open(self, election_id: int, key: str, create: bool = False) -> VoteShard:
+        """The shard of an election, or None if it has none and `create` is false."""
+        if self.mode == 'tables':
+            suffix = f'_e{election_id}'
+            if not create and not inspect(db.engine).has_table(f'vote_tokens{suffix}'):
+                return None
+            for name in ('vote_tokens', 'votes', 'candidate_tallies'):
+                if name + suffix in self._metadata.tables:
+                    self._metadata.remove(self._metadata.tables[name + suffix])
+            tables = ballot_tables(self._metadata, suffix)
+            with db.engine.begin() as conn:
+                self._metadata.create_all(conn, tables=tables)
+            return VoteShard(*tables)
+
+        path = self._path(election_id, key) if key else None
+        if create:
+            os.makedirs(self.directory, exist_ok=True)
+            open(path, 'ab').close()
+        elif path is None or not os.path.exists(path):
+            return None
+        # mode=rw: a connection opened after another process deleted the
+        # file fails instead of creating an empty one
+        engine = create_engine(f'sqlite:///file:{path}?mode=rw&uri=true')
+        if self._pragmas:
+            use_pragmas(engine, self._pragmas)
+        metadata = MetaData()
+        tables = ballot_tables(metadata)
+        if create:
+            metadata.create_all(engine)
+        return VoteShard(*tables, engine=engine, path=path, key=key)
+
+    def create_all(self) -> int:
+        """
+        Create the shards of every election that lacks one. Returns the
+        number of elections.
+
+        Elections from before Election.shard_key get a key here, and their
+        shard files (election_<id>.db) are renamed to match. Run it with no
+        other process using the shards.
+        """
+        if not self.mode:
+            return 0
+        unkeyed = Election.query.filter(Election.shard_key == None).all()
+        for election in unkeyed:
+            election.shard_key = uuid.uuid4().hex
+        db.session.commit()
+        if self.mode == 'files':
+            for election in unkeyed:
+                old = os.path.join(self.directory, f'election_{election.id}.db')
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(old + suffix):
+                        os.rename(old + suffix, self._path(election.id, election.shard_key) + suffix)
+        elections = db.session.query(Election.id, Election.shard_key).order_by(Election.id).all()
+        for election in elections:
+            self.create(election)
+        return len(elections)
+
+    def drop(self, election_id: int) -> None:
+        """Delete an election's shard: its tables or its file. Does nothing with sharding off."""
+        if not self.mode:
+            return
+        with self._lock:
+            shard = self._shards.pop(election_id, None)
+            if self.mode == 'tables':
+                tables = ballot_tables(MetaData(), f'_e{election_id}')
+                with db.engine.begin() as conn:
+                    for table in tables:
+                        table.drop(conn, checkfirst=True)
+                if shard is not None:
+                    for table in (shard.tokens, shard.votes, shard.tallies):
+                        self._metadata.remove(table)
+                return
+
+            if shard is not None:
+                shard.close()
+            for name in self._files(election_id):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    self.app.logger.warning('Could not delete vote shard %s: %s', name, e)
+
+    def drop_all(self) -> None:
+        """Delete every shard (used when the database is recreated). Needs an app context."""
+        if not self.mode:
+            return
+        if self.mode == 'tables':
+            with self._lock:
+                names = [name for name in inspect(db.engine).get_table_names() if _SHARD_TABLE.match(name)]
+                with db.engine.begin() as conn:
+                    for name in names:
+                        Table(name, MetaData()).drop(conn)
+                self._shards = {}
+                self._metadata = MetaData()
+            return
+
+        with self._lock:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards = {}
+            for name in glob.glob(os.path.join(self.directory, 'election_*.db*')):
+                os.remove(name)
+
+
+vote_shards = VoteShards()
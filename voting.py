@@ -1,6 +1,18 @@
+import re
 import secrets
-from models import db, VoteToken, Vote, Election, Candidate
-from sqlalchemy import func
+from models import db, Election, Candidate, CandidateTally
+from sqlalchemy import and_, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from catalog import election_catalog
+from vote_shards import vote_shards
+
+
+ALREADY_VOTED = "You have already voted in this election."
+ELECTION_CHANGED = "This election has changed. Please reload the page and vote again."
+
+# INSERT into vote_tokens or a vote_tokens_e<id> shard table
+_TOKEN_INSERT = re.compile(r'INSERT INTO "?vote_tokens(_e\d+)?"? ', re.IGNORECASE)
 
 
 def generate_anonymous_token() -> str:
@@ -10,68 +22,315 @@ def generate_anonymous_token() -> str:
 
 def has_voted(student_id: int, election_id: int) -> bool:
     """Check if a student has already voted in an election."""
-    token = VoteToken.query.filter_by(
-        student_id=student_id,
-        election_id=election_id
-    ).first()
+    shard = vote_shards.get(election_id)
+    if shard is None:
+        return False
+    tokens = shard.tokens
+    token = shard.execute(select(tokens.c.id).where(
+        tokens.c.student_id == student_id,
+        tokens.c.election_id == election_id
+    ).limit(1)).first()
     return token is not None
 
 
+def get_voted_election_ids(student_id: int, election_ids: list = None) -> set:
+    """
+    Get the ids of elections a student has voted in, with a single query
+    (one per election with VOTE_SHARDING).
+    
+    Pass `election_ids` to restrict the check (e.g. to active elections).
+    """
+    if election_ids is not None and not election_ids:
+        return set()
+    voted = set()
+    for shard, shard_election_ids in vote_shards.group(election_ids):
+        tokens = shard.tokens
+        query = select(tokens.c.election_id).where(tokens.c.student_id == student_id)
+        if shard_election_ids is not None:
+            query = query.where(tokens.c.election_id.in_(shard_election_ids))
+        voted.update(shard.execute(query).scalars())
+    return voted
+
+
 def cast_vote(student_id: int, election_id: int, candidate_id: int) -> tuple[bool, str]:
     """
     Cast a vote for a candidate in an election.
     
     This function implements the anonymity mechanism:
-    1. Check if student already voted (using vote_tokens table)
-    2. Generate a random token
-    3. Store token in vote_tokens (links student to election - for double-vote prevention)
-    4. Store vote in votes table (uses ONLY token - ensures anonymity)
+    1. Generate a random token
+    2. Store token in vote_tokens (links student to election - for double-vote prevention)
+    3. Store vote in votes table (uses ONLY token - ensures anonymity)
+    4. Increment the candidate's tally (same transaction as the vote)
+    
+    There is no "already voted?" read: the vote token is inserted first and
+    the unique_student_election constraint rejects a second ballot, which
+    also holds for concurrent submissions (double-clicks, retries).
+    
+    The cached catalog only turns away obviously invalid ballots; the
+    election and candidate are authorised against the database inside the
+    write transaction (see _authorise()).
     
     Returns:
         tuple: (success: bool, message: str)
     """
-    # Check if student already voted
-    if has_voted(student_id, election_id):
-        return False, "You have already voted in this election."
+    # Validate against the cached catalog of active elections. It may be
+    # behind the database, so a rejection is confirmed there
+    election = election_catalog.get().get(election_id)
+    if election is None or candidate_id not in election.candidate_ids:
+        reason = _authorise({election_id: candidate_id}).get(election_id)
+        if reason:
+            return False, reason
     
-    # Verify election exists and is active
-    election = Election.query.get(election_id)
-    if not election:
+    shard = vote_shards.get(election_id)
+    if shard is None:
         return False, "Election not found."
-    if not election.is_active:
-        return False, "This election is not active."
-    
-    # Verify candidate belongs to this election
-    candidate = Candidate.query.get(candidate_id)
-    if not candidate or candidate.election_id != election_id:
-        return False, "Invalid candidate for this election."
     
     try:
         # Generate anonymous token
         token = generate_anonymous_token()
         
-        # Create vote token (links student to election, NOT to the vote)
-        vote_token = VoteToken(
+        # Create vote token (links student to election, NOT to the vote).
+        # Written on its own so a duplicate fails before anything else is written.
+        shard.execute(insert(shard.tokens).values(
             student_id=student_id,
             election_id=election_id,
             token=token
-        )
-        db.session.add(vote_token)
+        ))
         
         # Create anonymous vote (uses ONLY token, no student reference)
-        vote = Vote(
+        shard.execute(insert(shard.votes).values(
             token=token,
             election_id=election_id,
             candidate_id=candidate_id
-        )
-        db.session.add(vote)
+        ))
+        
+        # Count the ballot in the same transaction
+        increment_tally(election_id, candidate_id)
+        
+        reason = _authorise({election_id: candidate_id}, {election_id: shard}).get(election_id)
+        if reason:
+            db.session.rollback()
+            return False, reason
         
         db.session.commit()
         return True, "Your vote has been cast successfully!"
         
-    except Exception as e:
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_duplicate_vote(e):
+            return False, ALREADY_VOTED
+        return False, "An error occurred while casting your vote. Please try again."
+    except Exception:
         db.session.rollback()
-        return False, f"An error occurred while casting your vote. Please try again."
+        return False, "An error occurred while casting your vote. Please try again."
+
+
+def cast_ballot(student_id: int, selections: dict) -> tuple[bool, dict]:
+    """
+    Cast votes in several elections in a single transaction.
+    
+    All selections are validated up front against the cached election
+    catalog. If every selection is valid, all VoteToken/Vote pairs are
+    written and committed together; otherwise nothing is written. As in
+    cast_vote, double votes (repeat or concurrent) are caught by the
+    unique_student_election constraint without a read first, the elections
+    already voted in are looked up only on that failure path, and the
+    selections are authorised against the database before the commit.
+    
+    With VOTE_SHARDING=files each election's shard file commits separately,
+    one after another, so a crash part-way through the commit can keep
+    the ballot in some elections only.
+    
+    Args:
+        selections: {election_id: candidate_id}
+    
+    Returns:
+        tuple: (success: bool, reasons: dict) - on failure, reasons maps
+               each rejected election_id to a message
+    """
+    if not selections:
+        return False, {}
+    
+    election_ids = list(selections)
+    catalog = election_catalog.get()
+    
+    cached = all(
+        catalog.get(election_id) is not None and candidate_id in catalog.get(election_id).candidate_ids
+        for election_id, candidate_id in selections.items()
+    )
+    if not cached:
+        # The catalog may be behind the database: confirm the rejection there
+        reasons = _authorise(selections)
+        if reasons:
+            return False, reasons
+    
+    # In election order, so ballots spanning several shard files take their
+    # write locks in the same order and cannot deadlock
+    shards = [(vote_shards.get(election_id), election_id) for election_id in sorted(selections)]
+    missing = {election_id: "Election not found." for shard, election_id in shards if shard is None}
+    if missing:
+        return False, missing
+    try:
+        for shard, election_id in shards:
+            # Same anonymity scheme as cast_vote: the token links the student
+            # to the election, the vote carries only the token
+            candidate_id = selections[election_id]
+            token = generate_anonymous_token()
+            shard.execute(insert(shard.tokens).values(student_id=student_id, election_id=election_id, token=token))
+            shard.execute(insert(shard.votes).values(token=token, election_id=election_id, candidate_id=candidate_id))
+            increment_tally(election_id, candidate_id)
+        
+        reasons = _authorise(selections, {election_id: shard for shard, election_id in shards})
+        if reasons:
+            db.session.rollback()
+            return False, reasons
+        
+        db.session.commit()
+        return True, {}
+        
+    except IntegrityError as e:
+        db.session.rollback()
+        if not is_duplicate_vote(e):
+            return False, {
+                election_id: "An error occurred while casting your vote. Please try again."
+                for election_id in election_ids
+            }
+        # Only on this failure path: find out which elections were already voted in
+        voted = get_voted_election_ids(student_id, election_ids)
+        return False, {election_id: ALREADY_VOTED for election_id in voted} or {
+            election_id: ALREADY_VOTED for election_id in election_ids
+        }
+    except Exception:
+        db.session.rollback()
+        return False, {
+            election_id: "An error occurred while casting your vote. Please try again."
+            for election_id in election_ids
+        }
+
+
+def _authorise(selections: dict, shards: dict = None) -> dict:
+    """
+    Check {election_id: candidate_id} against the database with one query:
+    each election must exist and be active, and each candidate must belong
+    to it. Pass the {election_id: VoteShard} written to, and a shard file
+    left over from a deleted election with the same id is rejected too.
+    
+    Another worker's election catalog can be up to CATALOG_TTL_SECONDS
+    behind, so a ballot is authorised here, after its rows are written and
+    in the same transaction. On SQLite that transaction already holds the
+    write lock on the main database, and on PostgreSQL the election rows
+    are share-locked, so an election cannot be closed or deleted before the
+    ballot commits. With VOTE_SHARDING=files the ballot rows live in the
+    shard file, and this is a check rather than a lock.
+    
+    Returns:
+        dict: {election_id: reason} for the rejected selections
+    """
+    found = {}
+    shard_keys = {}
+    rows = db.session.execute(
+        select(Election.id, Election.is_active, Election.shard_key, Candidate.id.label('candidate_id')).outerjoin(
+            Candidate, and_(Candidate.election_id == Election.id, Candidate.id.in_(set(selections.values())))
+        ).where(
+            Election.id.in_(list(selections))
+        ).with_for_update(read=True, of=Election)
+    )
+    for r in rows:
+        shard_keys[r.id] = r.shard_key
+        candidate_ids = found.setdefault(r.id, (r.is_active, set()))[1]
+        if r.candidate_id is not None:
+            candidate_ids.add(r.candidate_id)
+    
+    reasons = {}
+    for election_id, candidate_id in selections.items():
+        if election_id not in found:
+            reasons[election_id] = "Election not found."
+        elif not found[election_id][0]:
+            reasons[election_id] = "This election is not active."
+        elif candidate_id not in found[election_id][1]:
+            reasons[election_id] = "Invalid candidate for this election."
+        elif shards and not shards[election_id].matches(shard_keys[election_id]):
+            reasons[election_id] = ELECTION_CHANGED
+    return reasons
+
+
+def is_duplicate_vote(error: IntegrityError) -> bool:
+    """
+    Check whether an IntegrityError comes from the one-vote-per-election constraint.
+    
+    Decided from the driver's structured error details where it has them:
+    the constraint name (psycopg) or SQLite's extended result code for a
+    vote token insert (Python 3.11+). Other drivers report the constraint
+    name in the message (MySQL, PostgreSQL) and older sqlite3 the columns.
+    """
+    orig = error.orig
+    constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None)
+    if constraint:
+        return constraint.startswith('unique_student_election')
+    if getattr(orig, 'sqlite_errorname', None):
+        # Besides unique_student_election, the only unique column of a vote
+        # token table is the random 256-bit token
+        return (
+            orig.sqlite_errorname == 'SQLITE_CONSTRAINT_UNIQUE'
+            and _TOKEN_INSERT.match(error.statement or '') is not None
+        )
+    message = str(orig)
+    return (
+        'unique_student_election' in message
+        or re.search(r'vote_tokens(_e\d+)?\.student_id, vote_tokens(_e\d+)?\.election_id', message) is not None
+    )
+
+
+def _upsert_insert(shard):
+    """INSERT construct with ON CONFLICT support for the shard's database, or None."""
+    dialect = (shard.engine or db.engine).dialect.name
+    return {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(dialect)
+
+
+def increment_tally(election_id: int, candidate_id: int) -> None:
+    """
+    Add one vote to a candidate's tally. Caller commits.
+    
+    A single INSERT ... ON CONFLICT DO UPDATE, so two first votes for the
+    same candidate cannot both try to create the row. Other databases only
+    UPDATE the row add_candidate created.
+    """
+    shard = vote_shards.get(election_id)
+    tallies = shard.tallies
+    upsert = _upsert_insert(shard)
+    if upsert is None:
+        shard.execute(update(tallies).where(
+            tallies.c.candidate_id == candidate_id
+        ).values(vote_count=tallies.c.vote_count + 1))
+        return
+    shard.execute(upsert(tallies).values(
+        candidate_id=candidate_id,
+        election_id=election_id,
+        vote_count=1
+    ).on_conflict_do_update(
+        index_elements=[tallies.c.candidate_id],
+        set_={'vote_count': tallies.c.vote_count + 1}
+    ))
+
+
+def get_tallies(election_ids: list = None) -> dict:
+    """
+    Current tally rows of these elections (None: all of them).
+    Candidates without a row have no votes yet.
+    
+    Returns:
+        dict: {candidate_id: (election_id, vote_count)}
+    """
+    if election_ids is not None and not election_ids:
+        return {}
+    rows = {}
+    for shard, shard_election_ids in vote_shards.group(election_ids):
+        tallies = shard.tallies
+        query = select(tallies.c.candidate_id, tallies.c.election_id, tallies.c.vote_count)
+        if shard_election_ids is not None:
+            query = query.where(tallies.c.election_id.in_(shard_election_ids))
+        rows.update((r.candidate_id, (r.election_id, r.vote_count)) for r in shard.execute(query))
+    return rows
 
 
 def get_election_results(election_id: int) -> dict:
@@ -80,48 +339,198 @@ def get_election_results(election_id: int) -> dict:
     
     Returns vote counts per candidate WITHOUT any voter information.
     """
-    election = Election.query.get(election_id)
-    if not election:
-        return None
+    results = get_all_election_results([election_id])
+    return results[0] if results else None
+
+
+def get_all_election_results(election_ids: list = None) -> list:
+    """
+    Get results for all elections, or only for `election_ids`.
     
-    # Get vote counts per candidate
-    results = db.session.query(
-        Candidate.id,
-        Candidate.name,
-        Candidate.description,
-        func.count(Vote.id).label('vote_count')
+    Elections, candidates and tallies are fetched in a single joined query
+    and grouped per election here, instead of one query per election.
+    With VOTE_SHARDING the tallies live in the shards and are read with
+    get_tallies() instead of being joined.
+    Each entry has the same shape as get_election_results().
+    """
+    sharded = vote_shards.enabled
+    query = db.session.query(
+        Election.id.label('election_id'),
+        Election.title.label('election_title'),
+        Election.description.label('election_description'),
+        Election.is_active,
+        Election.closed_at,
+        Candidate.id.label('candidate_id'),
+        Candidate.name.label('candidate_name'),
+        Candidate.description.label('candidate_description'),
+        (literal(0) if sharded else func.coalesce(CandidateTally.vote_count, 0)).label('vote_count')
     ).outerjoin(
-        Vote, Candidate.id == Vote.candidate_id
-    ).filter(
-        Candidate.election_id == election_id
-    ).group_by(
-        Candidate.id
-    ).all()
-    
-    total_votes = sum(r.vote_count for r in results)
-    
-    return {
-        'election': {
-            'id': election.id,
-            'title': election.title,
-            'description': election.description,
-            'is_active': election.is_active
-        },
-        'candidates': [
-            {
-                'id': r.id,
-                'name': r.name,
-                'description': r.description,
-                'vote_count': r.vote_count,
-                'percentage': round((r.vote_count / total_votes * 100), 1) if total_votes > 0 else 0
+        Candidate, Candidate.election_id == Election.id
+    )
+    if not sharded:
+        query = query.outerjoin(CandidateTally, Candidate.id == CandidateTally.candidate_id)
+    if election_ids is not None:
+        if not election_ids:
+            return []
+        query = query.filter(Election.id.in_(election_ids))
+    
+    results = {}
+    for r in query.order_by(Election.id, Candidate.id):
+        entry = results.get(r.election_id)
+        if entry is None:
+            entry = results[r.election_id] = {
+                'election': {
+                    'id': r.election_id,
+                    'title': r.election_title,
+                    'description': r.election_description,
+                    'is_active': r.is_active,
+                    'closed_at': r.closed_at.isoformat() if r.closed_at else None
+                },
+                'candidates': [],
+                'total_votes': 0
             }
-            for r in results
-        ],
-        'total_votes': total_votes
-    }
+        if r.candidate_id is not None:
+            entry['candidates'].append({
+                'id': r.candidate_id,
+                'name': r.candidate_name,
+                'description': r.candidate_description,
+                'vote_count': r.vote_count
+            })
+    
+    if sharded:
+        tallies = get_tallies(list(results))
+        for entry in results.values():
+            for c in entry['candidates']:
+                c['vote_count'] = tallies.get(c['id'], (None, 0))[1]
+    
+    for entry in results.values():
+        total_votes = entry['total_votes'] = sum(c['vote_count'] for c in entry['candidates'])
+        for c in entry['candidates']:
+            c['percentage'] = round((c['vote_count'] / total_votes * 100), 1) if total_votes > 0 else 0
+    
+    return list(results.values())
+
+
+def reconcile_tallies(fix: bool = False) -> list:
+    """
+    Recompute vote counts from the votes table and compare with the tallies.
+    
+    This scans the whole votes table, so it is meant for maintenance rather
+    than request handling.
+    
+    Args:
+        fix: Recount drifted tallies from the votes table
+    
+    Returns:
+        list: one dict per drifted candidate (candidate_id, election_id,
+              tally, actual)
+    """
+    candidates = {}
+    for candidate in db.session.query(Candidate.id, Candidate.election_id):
+        candidates.setdefault(candidate.election_id, []).append(candidate.id)
+    
+    drift = []
+    for shard, election_ids in vote_shards.group():
+        votes, tallies = shard.votes, shard.tallies
+        actual_query = select(
+            votes.c.candidate_id,
+            func.count(votes.c.id).label('vote_count')
+        ).group_by(votes.c.candidate_id)
+        tally_query = select(tallies.c.candidate_id, tallies.c.vote_count)
+        if election_ids is not None:
+            actual_query = actual_query.where(votes.c.election_id.in_(election_ids))
+            tally_query = tally_query.where(tallies.c.election_id.in_(election_ids))
+        actual = {r.candidate_id: r.vote_count for r in shard.execute(actual_query)}
+        counted = {r.candidate_id: r.vote_count for r in shard.execute(tally_query)}
+        
+        shard_drift = []
+        for election_id in (election_ids if election_ids is not None else list(candidates)):
+            for candidate_id in candidates.get(election_id, []):
+                tally = counted.get(candidate_id)
+                expected = actual.get(candidate_id, 0)
+                if (tally or 0) != expected:
+                    shard_drift.append({
+                        'candidate_id': candidate_id,
+                        'election_id': election_id,
+                        'tally': tally,
+                        'actual': expected
+                    })
+        if fix and shard_drift:
+            _recount_tallies(shard, shard_drift)
+        drift.extend(shard_drift)
+    
+    if fix:
+        db.session.commit()
+    return drift
+
+
+def _recount_tallies(shard, drift: list) -> None:
+    """
+    Set the drifted tallies to their votes count. Caller commits.
+    
+    The count is taken inside a single UPDATE rather than copied from the
+    report, so votes committed since the report was built are not lost.
+    """
+    votes, tallies = shard.votes, shard.tallies
+    missing = [d for d in drift if d['tally'] is None]
+    if missing:
+        upsert = _upsert_insert(shard)
+        rows = [{'candidate_id': d['candidate_id'], 'election_id': d['election_id'], 'vote_count': 0} for d in missing]
+        if upsert is None:
+            shard.execute(insert(tallies), rows)
+        else:
+            shard.execute(upsert(tallies).on_conflict_do_nothing(index_elements=[tallies.c.candidate_id]), rows)
+    
+    actual = select(func.count(votes.c.id)).where(
+        votes.c.candidate_id == tallies.c.candidate_id
+    ).scalar_subquery()
+    shard.execute(update(tallies).where(
+        tallies.c.candidate_id.in_([d['candidate_id'] for d in drift])
+    ).values(vote_count=actual))
+
+
+# ==================== ADMIN WRITES ====================
+# Like ballots, these write to an election's shard, so app.py runs them on
+# the election's writer lane (serial_writer.run_in_lane(vote_shards.lane(...))).
 
+def create_candidate(election_id: int, name: str, description: str = '') -> int:
+    """Add a candidate and its zero tally row. Commits; returns the candidate id."""
+    shard = vote_shards.get(election_id)
+    if shard is None:
+        raise LookupError(f'Election {election_id} has no vote shard.')
+    candidate = Candidate(election_id=election_id, name=name, description=description)
+    db.session.add(candidate)
+    db.session.flush()
+    shard.execute(insert(shard.tallies).values(candidate_id=candidate.id, election_id=election_id, vote_count=0))
+    db.session.commit()
+    return candidate.id
 
-def get_all_election_results() -> list:
-    """Get results for all elections."""
-    elections = Election.query.all()
-    return [get_election_results(e.id) for e in elections]
+
+def remove_candidate(candidate_id: int) -> None:
+    """Delete a candidate together with its votes and tally. Commits."""
+    candidate = db.session.get(Candidate, candidate_id)
+    shard = vote_shards.get(candidate.election_id)
+    if shard is not None:
+        shard.execute(delete(shard.votes).where(shard.votes.c.candidate_id == candidate_id))
+        shard.execute(delete(shard.tallies).where(shard.tallies.c.candidate_id == candidate_id))
+    db.session.delete(candidate)
+    db.session.commit()
+
+
+def remove_vote_tokens(student_id: int, election_ids: list = None) -> None:
+    """
+    Delete a student's vote tokens in these elections (None: all of them);
+    their anonymous votes stay. Commits.
+    
+    Each shard is read first and only written to if it holds one of the
+    tokens, so deleting a student doesn't take the write lock of every
+    shard file.
+    """
+    for shard, shard_election_ids in vote_shards.group(election_ids):
+        tokens = shard.tokens
+        condition = tokens.c.student_id == student_id
+        if shard_election_ids is not None:
+            condition = and_(condition, tokens.c.election_id.in_(shard_election_ids))
+        if shard.execute(select(tokens.c.id).where(condition).limit(1)).first() is not None:
+            shard.execute(delete(tokens).where(condition))
+    db.session.commit()
@@ -0,0 +1,33 @@
+"""
+WSGI entry point for production servers.
+
+Importing this module builds the app and does the one-off work a worker
+would otherwise repeat on its first requests: compiling every template,
+configuring the model mappers and compiling the URL map. Under gunicorn
+with preload_app (gunicorn.conf.py) this happens once in the master, and
+the forked workers share the result copy-on-write.
+
+No database connection is opened here; see post_fork in gunicorn.conf.py
+for the per-worker engine reset.
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+from sqlalchemy.orm import configure_mappers
+from app import app
+
+
+def preload(flask_app) -> int:
+    """Warm the app before forking. Returns the number of templates compiled."""
+    templates = flask_app.jinja_env.list_templates()
+    for name in templates:
+        flask_app.jinja_env.get_template(name)
+    configure_mappers()
+    flask_app.url_map.update()
+    return len(templates)
+
+
+preload(app)
+
+application = app